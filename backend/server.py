@@ -1,33 +1,521 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import Binary
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo import monitoring
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, OperationFailure
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
+from collections import Counter as StackCounter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import bisect
+import calendar
+import math
+import sys
+import threading
+import functools
+import heapq
+import random
 import uuid
-from datetime import datetime, timezone
+import time
+from datetime import datetime, timezone, timedelta
+from zoneinfo import ZoneInfo
 import jwt
+import numpy as np
 import bcrypt
+import base64
+import contextlib
+import hmac
+import re
+import socket
+import hashlib
+import json
+import orjson
+import zlib
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Reference point for the cold-start timings reported by /api/health
+BOOT_STARTED = time.perf_counter()
+
+# ── Instrumentation ─────────────────────────────────────
+
+# Minimal Prometheus-style registry. Recording is a bisect plus a few increments
+# under a lock (Mongo command events arrive on driver threads); rendering happens
+# only when /metrics is scraped.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def quote_label(value) -> str:
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+class Metric:
+    def __init__(self, name: str, help_text: str, kind: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _label_text(self, values: tuple, extra: str = "") -> str:
+        pairs = [f"{k}={quote_label(v)}" for k, v in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = list(self._series.items())
+        for values, value in series:
+            lines.extend(self._render_series(values, value))
+        return lines
+
+    def _render_series(self, values: tuple, value) -> list:
+        return [f"{self.name}{self._label_text(values)} {value}"]
+
+class Counter(Metric):
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        super().__init__(name, help_text, "counter", labels)
+
+    def inc(self, values: tuple = (), amount: float = 1):
+        with self._lock:
+            self._series[values] = self._series.get(values, 0) + amount
+
+class Gauge(Metric):
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        super().__init__(name, help_text, "gauge", labels)
+
+    def inc(self, values: tuple = (), amount: float = 1):
+        with self._lock:
+            self._series[values] = self._series.get(values, 0) + amount
+
+    def dec(self, values: tuple = (), amount: float = 1):
+        self.inc(values, -amount)
+
+    def set(self, values: tuple, value: float):
+        with self._lock:
+            self._series[values] = value
+
+class Histogram(Metric):
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, "histogram", labels)
+        self.buckets = buckets
+
+    def observe(self, values: tuple, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def _render_series(self, values: tuple, series) -> list:
+        counts, total, count = series
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{self.name}_bucket{self._label_text(values, 'le=' + quote_label(le))} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {total}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {count}")
+        return lines
+
+HTTP_LATENCY = Histogram("flowforge_http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+HTTP_REQUESTS = Counter("flowforge_http_requests_total", "HTTP responses by route and status", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("flowforge_http_requests_in_flight", "HTTP requests currently being served")
+MONGO_LATENCY = Histogram("flowforge_mongo_operation_duration_seconds", "MongoDB command latency", ("collection", "op"))
+MONGO_FAILURES = Counter("flowforge_mongo_operation_failures_total", "Failed MongoDB commands", ("collection", "op"))
+PASSWORD_LATENCY = Histogram("flowforge_password_hash_duration_seconds", "bcrypt hash/verify latency including queueing", ("op",))
+LLM_LATENCY = Histogram("flowforge_llm_call_duration_seconds", "LLM gateway call latency", ("provider", "outcome"))
+RATE_LIMITED = Counter("flowforge_rate_limited_total", "Requests rejected by rate limiting", ("rule",))
+EXPORT_ROWS = Counter("flowforge_export_rows_total", "Rows streamed by /api/export", ("kind",))
+COMPONENT_STATS = Gauge("flowforge_component_stat", "Numeric internal counters reported by /api/health", ("component", "stat"))
+METRICS = [HTTP_LATENCY, HTTP_REQUESTS, HTTP_IN_FLIGHT, MONGO_LATENCY, MONGO_FAILURES, PASSWORD_LATENCY, LLM_LATENCY, RATE_LIMITED, EXPORT_ROWS, COMPONENT_STATS]
+
+# Times every driver command (including getMore for cursors) by collection and op
+class MongoCommandTimer(monitoring.CommandListener):
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        command = event.command
+        collection = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else "-"
+
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, "-")
+        MONGO_LATENCY.observe((collection, event.command_name), event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop(event.request_id, "-")
+        MONGO_LATENCY.observe((collection, event.command_name), event.duration_micros / 1e6)
+        MONGO_FAILURES.inc((collection, event.command_name))
+
+# Pure ASGI (no per-request task or body buffering, unlike BaseHTTPMiddleware).
+# Routes are labelled by their template, e.g. /api/automations/{auto_id}/toggle.
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            label = (scope["method"], route.path if route is not None else "unmatched")
+            HTTP_LATENCY.observe(label, time.perf_counter() - started)
+            HTTP_REQUESTS.inc(label + (status[0],))
+
+# ── Profiling ───────────────────────────────────────────
+
+# Sampling profiler for individual requests and for a rolling window of the whole
+# worker. A daemon thread wakes every PROFILE_INTERVAL and records, for each task
+# being profiled, either its live Python stack (if it is running on the event loop
+# thread at that instant) or its suspended await chain (coroutine -> cr_await ->
+# ...), so time spent waiting on Mongo or the LLM shows up under the handler that
+# awaited it. Samples are kept as collapsed stacks ("a;b;c count"), the input
+# format of flamegraph.pl and speedscope. The thread only runs while something is
+# being profiled, so the cost when off is one header lookup per request.
+
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', '0.005'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '100'))
+PROFILE_WINDOW = int(os.environ.get('PROFILE_WINDOW', '60'))
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})"
+
+def await_chain(coro) -> list:
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "ag_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is not None:
+            frames.append(frame_label(frame))
+        nxt = getattr(coro, "cr_await", None) or getattr(coro, "ag_await", None) or getattr(coro, "gi_yieldfrom", None)
+        if isinstance(nxt, asyncio.Future):
+            frames.append(f"<await {type(nxt).__name__}>")
+            break
+        coro = nxt
+    return frames
+
+def live_stack(leaf, root) -> Optional[list]:
+    frames, frame = [], leaf
+    while frame is not None:
+        frames.append(frame_label(frame))
+        if frame is root:
+            return frames[::-1]
+        frame = frame.f_back
+    return frames[::-1] if root is None else None
+
+class SamplingProfiler:
+    def __init__(self, interval: float, keep: int, window: int):
+        self.interval = interval
+        self.profiles = deque(maxlen=keep)
+        self.window_until = 0.0
+        self._window = deque(maxlen=window)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id = None
+
+    def begin(self, task: asyncio.Task) -> StackCounter:
+        stacks = StackCounter()
+        with self._lock:
+            self._active[task] = stacks
+        self._ensure_thread(task.get_loop())
+        return stacks
+
+    def end(self, task: asyncio.Task):
+        with self._lock:
+            self._active.pop(task, None)
+
+    def start_window(self, seconds: float, loop: asyncio.AbstractEventLoop):
+        self.window_until = time.monotonic() + seconds
+        self._ensure_thread(loop)
+
+    def window_stacks(self) -> StackCounter:
+        total = StackCounter()
+        with self._lock:
+            for _, stacks in self._window:
+                total.update(stacks)
+        return total
+
+    # Called on the event loop thread, whose stack is the one sampled
+    def _ensure_thread(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+                self._thread.start()
+
+    def _sample_loop(self):
+        while True:
+            with self._lock:
+                windowed = time.monotonic() < self.window_until
+                if not self._active and not windowed:
+                    self._thread = None
+                    return
+                targets = list(self._active.items())
+            leaf = sys._current_frames().get(self._loop_thread_id)
+            try:
+                if targets:
+                    self._sample_tasks(targets, leaf)
+                if windowed:
+                    self._sample_window(leaf)
+            except Exception:
+                pass  # frames can change under us; drop the sample
+            time.sleep(self.interval)
+
+    def _task_stack(self, task: asyncio.Task, leaf) -> Optional[str]:
+        coro = task.get_coro()
+        root = getattr(coro, "cr_frame", None)
+        stack = live_stack(leaf, root) if root is not None and leaf is not None else None
+        stack = stack or await_chain(coro)
+        return ";".join(stack) if stack else None
+
+    def _sample_tasks(self, targets: list, leaf):
+        for task, stacks in targets:
+            stack = self._task_stack(task, leaf)
+            if stack:
+                stacks[stack] += 1
+
+    def _sample_window(self, leaf):
+        second = int(time.monotonic())
+        with self._lock:
+            if not self._window or self._window[-1][0] != second:
+                self._window.append((second, StackCounter()))
+            current = self._window[-1][1]
+        running = live_stack(leaf, None) if leaf is not None else None
+        if running:
+            current["<running>;" + ";".join(running)] += 1
+        for task in asyncio.all_tasks(self._loop):
+            stack = ";".join(await_chain(task.get_coro()))
+            if stack:
+                current["<waiting>;" + stack] += 1
+
+def collapsed(stacks: StackCounter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+profiler = SamplingProfiler(PROFILE_INTERVAL, PROFILE_KEEP, PROFILE_WINDOW)
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            return await self.app(scope, receive, send)
+        task = asyncio.current_task()
+        profile_id = str(uuid.uuid4())
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        started = time.perf_counter()
+        stacks = profiler.begin(task)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.end(task)
+            route = scope.get("route")
+            profiler.profiles.append({
+                "id": profile_id,
+                "method": scope["method"],
+                "route": route.path if route is not None else scope["path"],
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "samples": sum(stacks.values()),
+                "stacks": stacks,
+            })
+
+    @staticmethod
+    def _wanted(scope) -> bool:
+        if PROFILE_ADMIN_TOKEN:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    return hmac.compare_digest(value.decode("latin-1"), PROFILE_ADMIN_TOKEN)
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+# MongoDB connection. The client is opened by the app lifespan (or the maintenance CLI),
+# so every worker process gets its own pool after the server forks.
+MONGO_URL = os.environ['MONGO_URL']
+DB_NAME = os.environ['DB_NAME']
+MONGO_MAX_POOL = int(os.environ.get('MONGO_MAX_POOL', '100'))
+MONGO_MIN_POOL = int(os.environ.get('MONGO_MIN_POOL', '10'))
+MONGO_MAX_IDLE_MS = int(os.environ.get('MONGO_MAX_IDLE_MS', '300000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '30000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+# e.g. secondaryPreferred to move reads off the primary; reads may then lag writes
+MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE', 'primary')
+# Connections opened before the worker starts accepting traffic
+MONGO_WARM_CONNECTIONS = int(os.environ.get('MONGO_WARM_CONNECTIONS', str(MONGO_MIN_POOL)))
+
+def connect_mongo(url: str = MONGO_URL) -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        url,
+        maxPoolSize=MONGO_MAX_POOL,
+        minPoolSize=MONGO_MIN_POOL,
+        maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        readPreference=MONGO_READ_PREFERENCE,
+        event_listeners=[MongoCommandTimer()],
+    )
+
+client: Optional[AsyncIOMotorClient] = None
+db = None
 
 # JWT config
 JWT_SECRET = os.environ.get('JWT_SECRET', 'flowforge-secret-key-2026')
 JWT_ALGORITHM = "HS256"
 
+# Fail startup if any handler query shape would collection-scan
+VERIFY_QUERY_PLANS = os.environ.get('VERIFY_QUERY_PLANS', '').lower() in ('1', 'true', 'yes')
+
+# Activity log write-behind buffer
+ACTIVITY_WRITE_BEHIND = os.environ.get('ACTIVITY_WRITE_BEHIND', '1').lower() in ('1', 'true', 'yes')
+ACTIVITY_BUFFER_SIZE = int(os.environ.get('ACTIVITY_BUFFER_SIZE', '10000'))
+ACTIVITY_BATCH_SIZE = int(os.environ.get('ACTIVITY_BATCH_SIZE', '500'))
+ACTIVITY_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', '0.5'))
+# Longest pause between retries of a batch the database refused (activity and hooks)
+WRITE_RETRY_MAX_DELAY = float(os.environ.get('WRITE_RETRY_MAX_DELAY', '30'))
+
+# Activity log retention: rows older than the hot window move to compressed archive chunks
+ACTIVITY_HOT_DAYS = float(os.environ.get('ACTIVITY_HOT_DAYS', '30'))
+ACTIVITY_ARCHIVE = os.environ.get('ACTIVITY_ARCHIVE', '1').lower() in ('1', 'true', 'yes')
+ACTIVITY_ARCHIVE_GRACE_DAYS = float(os.environ.get('ACTIVITY_ARCHIVE_GRACE_DAYS', '7'))
+ACTIVITY_ARCHIVE_INTERVAL = float(os.environ.get('ACTIVITY_ARCHIVE_INTERVAL', '3600'))
+ACTIVITY_ARCHIVE_BATCH = int(os.environ.get('ACTIVITY_ARCHIVE_BATCH', '5000'))
+ACTIVITY_ARCHIVE_CHUNK = int(os.environ.get('ACTIVITY_ARCHIVE_CHUNK', '1000'))
+
+# Template library: optional JSON file and/or Mongo collection replacing the built-in list
+TEMPLATES_FILE = os.environ.get('TEMPLATES_FILE', '')
+TEMPLATES_COLLECTION = os.environ.get('TEMPLATES_COLLECTION', '')
+
+# Local template matcher: prompts scoring at least the threshold, and clearly ahead of
+# the runner-up template, skip the LLM
+TEMPLATE_MATCH_THRESHOLD = float(os.environ.get('TEMPLATE_MATCH_THRESHOLD', '0.45'))
+TEMPLATE_MATCH_MARGIN = float(os.environ.get('TEMPLATE_MATCH_MARGIN', '0.25'))
+TEMPLATE_MATCH_DIM = int(os.environ.get('TEMPLATE_MATCH_DIM', '4096'))
+TEMPLATE_SEARCH_MIN_SCORE = float(os.environ.get('TEMPLATE_SEARCH_MIN_SCORE', '0.1'))
+
+# Automation execution engine
+RUN_WORKERS = int(os.environ.get('RUN_WORKERS', '32'))
+RUN_QUEUE = int(os.environ.get('RUN_QUEUE', '1000'))
+RUN_NODE_TIMEOUT = float(os.environ.get('RUN_NODE_TIMEOUT', '10'))
+RUN_PLAN_CACHE_SIZE = int(os.environ.get('RUN_PLAN_CACHE_SIZE', '10000'))
+RUN_RETENTION_DAYS = float(os.environ.get('RUN_RETENTION_DAYS', '30'))
+
+# Time-trigger scheduler
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1').lower() in ('1', 'true', 'yes')
+SCHEDULER_TIMEZONE = os.environ.get('SCHEDULER_TIMEZONE', 'UTC')
+SCHEDULER_LEASE_TTL = int(os.environ.get('SCHEDULER_LEASE_TTL', str(86400 * 7)))
+SCHEDULER_SYNC_INTERVAL = float(os.environ.get('SCHEDULER_SYNC_INTERVAL', '15'))
+SCHEDULER_FIRE_GRACE = float(os.environ.get('SCHEDULER_FIRE_GRACE', '60'))
+
+# Webhook ingestion
+HOOK_BUFFER_SIZE = int(os.environ.get('HOOK_BUFFER_SIZE', '50000'))
+HOOK_BATCH_SIZE = int(os.environ.get('HOOK_BATCH_SIZE', '1000'))
+HOOK_FLUSH_INTERVAL = float(os.environ.get('HOOK_FLUSH_INTERVAL', '0.2'))
+HOOK_MAX_BYTES = int(os.environ.get('HOOK_MAX_BYTES', str(64 * 1024)))
+HOOK_DISPATCH_BATCH = int(os.environ.get('HOOK_DISPATCH_BATCH', '200'))
+HOOK_POLL_INTERVAL = float(os.environ.get('HOOK_POLL_INTERVAL', '0.5'))
+HOOK_CLAIM_TIMEOUT = float(os.environ.get('HOOK_CLAIM_TIMEOUT', '300'))
+HOOK_RETENTION = int(os.environ.get('HOOK_RETENTION', '86400'))
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+# Run metrics rollups
+METRICS_MINUTE_RETENTION = float(os.environ.get('METRICS_MINUTE_RETENTION', str(2 * 3600)))
+METRICS_HOUR_RETENTION = float(os.environ.get('METRICS_HOUR_RETENTION', str(2 * 86400)))
+METRICS_COMPACT_INTERVAL = float(os.environ.get('METRICS_COMPACT_INTERVAL', '300'))
+METRICS_COMPACT_BATCH = int(os.environ.get('METRICS_COMPACT_BATCH', '1000'))
+
+# Streaming exports
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+EXPORT_MAX_CONCURRENCY = int(os.environ.get('EXPORT_MAX_CONCURRENCY', '4'))
+
+# Live dashboard channel
+LIVE_COALESCE = float(os.environ.get('LIVE_COALESCE', '0.25'))
+LIVE_POLL_INTERVAL = float(os.environ.get('LIVE_POLL_INTERVAL', '2'))
+LIVE_HEARTBEAT = float(os.environ.get('LIVE_HEARTBEAT', '15'))
+LIVE_MAX_AGE = float(os.environ.get('LIVE_MAX_AGE', '300'))
+LIVE_MAX_PENDING = int(os.environ.get('LIVE_MAX_PENDING', '500'))
+LIVE_REPLAY = int(os.environ.get('LIVE_REPLAY', '10000'))
+LIVE_TOKEN_TTL = float(os.environ.get('LIVE_TOKEN_TTL', '60'))
+
 # LLM
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY', '')
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'emergent')
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '16'))
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', '20'))
+LLM_BREAKER_FAILURES = int(os.environ.get('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_COOLDOWN = float(os.environ.get('LLM_BREAKER_COOLDOWN', '30'))
+LLM_FAKE_LATENCY = float(os.environ.get('LLM_FAKE_LATENCY', '0.2'))
+LLM_FAKE_FAILURE_RATE = float(os.environ.get('LLM_FAKE_FAILURE_RATE', '0'))
+AI_CACHE_SIZE = int(os.environ.get('AI_CACHE_SIZE', '5000'))
+AI_CACHE_TTL = float(os.environ.get('AI_CACHE_TTL', '3600'))
+
+# User cache
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '10000'))
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '60'))
+USER_CACHE_ONBOARDING_TTL = float(os.environ.get('USER_CACHE_ONBOARDING_TTL', '5'))
+
+# Rate limiting: "<requests>/<seconds>" per client IP and email (login), per client IP
+# (login across all emails, register) or per user (AI). Behind a load balancer or ingress, run uvicorn with
+# --proxy-headers --forwarded-allow-ips=<proxy addresses> so the client address is the
+# caller's rather than the proxy's; otherwise every caller shares the proxy's IP.
+RATE_LIMITS_ENABLED = os.environ.get('RATE_LIMITS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+RATE_LIMIT_LOGIN = os.environ.get('RATE_LIMIT_LOGIN', '10/60')
+RATE_LIMIT_LOGIN_IP = os.environ.get('RATE_LIMIT_LOGIN_IP', '60/60')
+RATE_LIMIT_REGISTER = os.environ.get('RATE_LIMIT_REGISTER', '20/3600')
+RATE_LIMIT_AI = os.environ.get('RATE_LIMIT_AI', '30/60')
+RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'memory')
+RATE_LIMIT_SHARDS = int(os.environ.get('RATE_LIMIT_SHARDS', '16'))
+RATE_LIMIT_SHARD_SIZE = int(os.environ.get('RATE_LIMIT_SHARD_SIZE', '10000'))
+
+# Password hashing
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '4'))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', '32'))
 
-app = FastAPI()
+# Hot handlers return ORJSONResponse directly: FastAPI then skips jsonable_encoder and
+# response_model re-validation (response_model is kept for the OpenAPI schema only).
+# Sensitive fields are dropped by Mongo projections rather than dict rebuilding.
 api_router = APIRouter(prefix="/api")
 
 # Configure logging
@@ -77,9 +565,24 @@ class AutomationOut(BaseModel):
     nodes: list = []
     tasks_run: int = 0
     time_saved_minutes: int = 0
+    minutes_saved: int = 0
+    version: int = 1
     created_at: str
+    updated_at: Optional[str] = None
     user_id: str
 
+BULK_MAX = 500
+
+class AutomationBulkCreate(BaseModel):
+    automations: List[AutomationCreate] = Field(min_length=1, max_length=BULK_MAX)
+
+class AutomationBulkStatus(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=BULK_MAX)
+    status: str = Field(pattern="^(active|paused)$")
+
+class AutomationBulkDelete(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=BULK_MAX)
+
 class AIRequest(BaseModel):
     message: str
 
@@ -90,21 +593,128 @@ class OnboardingUpdate(BaseModel):
 # ── Auth helpers ────────────────────────────────────────
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event loop.
+# Calls beyond workers + queue are rejected immediately instead of piling up.
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int):
+        self.capacity = workers + max_queue
+        self.pending = 0
+        self.rejected = 0
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Authentication busy, retry shortly", headers={"Retry-After": "1"})
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            PASSWORD_LATENCY.observe((fn.__name__,), time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(verify_password, password, hashed)
+
+    def stats(self) -> dict:
+        return {"pending": self.pending, "capacity": self.capacity, "rejected": self.rejected}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE)
+
 def create_token(user_id: str) -> str:
     return jwt.encode({"user_id": user_id, "exp": datetime.now(timezone.utc).timestamp() + 86400 * 7}, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def create_scoped_token(user_id: str, scope: str, ttl: float) -> str:
+    return jwt.encode({"user_id": user_id, "scope": scope, "exp": datetime.now(timezone.utc).timestamp() + ttl}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+# Bounded LRU with a per-entry TTL and hit/miss counters
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])
+
+    def set(self, key: str, value: dict, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), dict(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+# Per worker: invalidate() only reaches the worker that served the write, so other
+# workers serve the old profile for up to USER_CACHE_TTL. Users still onboarding are
+# cached for USER_CACHE_ONBOARDING_TTL instead, since onboard_user flips their profile
+# right after sign-up and the next request may land on any worker.
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+PUBLIC_USER_PROJECTION = {"_id": 0, "password": 0}
+
+async def get_user_by_id(user_id: str) -> Optional[dict]:
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await db.users.find_one({"id": user_id}, PUBLIC_USER_PROJECTION)
+        if user:
+            user_cache.set(user_id, user, None if user.get("onboarded") else USER_CACHE_ONBOARDING_TTL)
+    return user
+
 async def get_current_user(authorization: str = Header(None)):
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing authorization")
     try:
         token = authorization.replace("Bearer ", "")
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
+        # Scoped tokens only open the endpoint they were issued for
+        if payload.get("scope") is not None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        user = await get_user_by_id(payload["user_id"])
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         return user
@@ -113,11 +723,139 @@ async def get_current_user(authorization: str = Header(None)):
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+# EventSource cannot set headers, so /api/live also accepts ?token=. URLs end up in
+# proxy and access logs, so the query string only takes a LIVE_TOKEN_TTL token scoped
+# to "live" (from POST /api/live/token), never the session token.
+async def get_live_user(authorization: str = Header(None), token: Optional[str] = Query(None)):
+    if authorization:
+        return await get_current_user(authorization)
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing authorization")
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("scope") != "live":
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user = await get_user_by_id(payload["user_id"])
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
+
+# ── Rate limiting ───────────────────────────────────────
+
+# Token buckets per (rule, key), keyed by client IP for the bcrypt routes and by user id
+# for the LLM routes. Login checks two buckets: a strict one per IP and email, so
+# callers behind one NAT or proxy address do not lock each other out, and a generous
+# one per IP, so one client cannot spray bcrypt verifies across many emails. The
+# in-process store is split into shards. Each shard is an LRU capped at RATE_LIMIT_SHARD_SIZE buckets, so memory stays bounded and eviction
+# stays O(1) however many clients show up; an evicted bucket was idle longest and
+# restarts full. Everything runs on the event loop, so no locks are needed.
+#
+# With RATE_LIMIT_STORE=mongo, requests that pass the local bucket are also charged
+# against a bucket in rate_limits that all replicas share. The refill and take are
+# one atomic pipeline update. Rejections never touch Mongo, and if Mongo is
+# unreachable the shared check fails open.
+def parse_rate(spec: str) -> tuple:
+    count, _, seconds = spec.partition("/")
+    capacity = float(count)
+    return capacity, capacity / float(seconds or 1)
+
+RATE_LIMIT_RULES = {
+    "login": parse_rate(RATE_LIMIT_LOGIN),
+    "login_ip": parse_rate(RATE_LIMIT_LOGIN_IP),
+    "register": parse_rate(RATE_LIMIT_REGISTER),
+    "ai": parse_rate(RATE_LIMIT_AI),
+}
+
+class TokenBuckets:
+    def __init__(self, shards: int, shard_size: int):
+        self.shard_size = shard_size
+        self.rejected = 0
+        self._shards = [OrderedDict() for _ in range(shards)]
+
+    def take(self, key: str, capacity: float, rate: float) -> float:
+        """Take one token. Returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        shard = self._shards[hash(key) % len(self._shards)]
+        tokens, updated = shard.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        shard[key] = (tokens, now)
+        shard.move_to_end(key)
+        if len(shard) > self.shard_size:
+            shard.popitem(last=False)
+        return wait
+
+    def stats(self) -> dict:
+        return {
+            "store": RATE_LIMIT_STORE,
+            "buckets": sum(len(shard) for shard in self._shards),
+            "rejected": self.rejected,
+        }
+
+rate_buckets = TokenBuckets(RATE_LIMIT_SHARDS, RATE_LIMIT_SHARD_SIZE)
+
+async def take_shared_token(key: str, capacity: float, rate: float) -> float:
+    now = datetime.now(timezone.utc)
+    elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, 1000]}
+    refilled = {"$min": [capacity, {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed, rate]}]}]}
+    doc = await db.rate_limits.find_one_and_update(
+        {"_id": key},
+        [
+            {"$set": {"tokens": refilled, "updated": now}},
+            {"$set": {
+                "allowed": {"$gte": ["$tokens", 1]},
+                "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+            }},
+        ],
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return 0.0 if doc["allowed"] else (1 - doc["tokens"]) / rate
+
+async def check_rate(rule: str, key: str):
+    capacity, rate = RATE_LIMIT_RULES[rule]
+    bucket = f"{rule}:{key}"
+    wait = rate_buckets.take(bucket, capacity, rate)
+    if not wait and RATE_LIMIT_STORE == "mongo":
+        try:
+            wait = await take_shared_token(bucket, capacity, rate)
+        except Exception as e:
+            logger.error(f"Shared rate limit check failed: {e}")
+    if wait:
+        rate_buckets.rejected += 1
+        RATE_LIMITED.inc((rule,))
+        raise HTTPException(status_code=429, detail="Too many requests, retry later", headers={"Retry-After": str(math.ceil(wait))})
+
+def client_ip(request: Request) -> str:
+    # uvicorn --proxy-headers has already replaced this with the forwarded address
+    return request.client.host if request.client else "unknown"
+
+def limit_by_ip(rule: str):
+    async def dependency(request: Request):
+        if RATE_LIMITS_ENABLED:
+            await check_rate(rule, client_ip(request))
+    return dependency
+
+def limit_by_user(rule: str):
+    # Shares the request's cached get_current_user result with the handler
+    async def dependency(current_user: dict = Depends(get_current_user)):
+        if RATE_LIMITS_ENABLED:
+            await check_rate(rule, current_user["id"])
+    return dependency
+
 # ── Auth routes ─────────────────────────────────────────
 
-@api_router.post("/auth/register")
+@api_router.post("/auth/register", dependencies=[Depends(limit_by_ip("register"))])
 async def register(data: UserCreate):
-    existing = await db.users.find_one({"email": data.email}, {"_id": 0})
+    existing = await db.users.find_one({"email": data.email}, {"_id": 1})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     user_id = str(uuid.uuid4())
@@ -125,27 +863,34 @@ async def register(data: UserCreate):
         "id": user_id,
         "name": data.name,
         "email": data.email,
-        "password": hash_password(data.password),
+        "password": await password_hasher.hash(data.password),
         "job_title": data.job_title or "",
         "industry": data.industry or "",
         "onboarded": False,
         "created_at": datetime.now(timezone.utc).isoformat(),
     }
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        # Lost a concurrent registration race; the unique index on users.email decides
+        raise HTTPException(status_code=400, detail="Email already registered")
     token = create_token(user_id)
-    return {"token": token, "user": {k: v for k, v in user_doc.items() if k not in ("password", "_id")}}
+    return ORJSONResponse({"token": token, "user": {k: v for k, v in user_doc.items() if k not in ("password", "_id")}})
 
-@api_router.post("/auth/login")
-async def login(data: UserLogin):
+@api_router.post("/auth/login", dependencies=[Depends(limit_by_ip("login_ip"))])
+async def login(data: UserLogin, request: Request):
+    if RATE_LIMITS_ENABLED:
+        await check_rate("login", f"{client_ip(request)}|{data.email.lower()}")
     user = await db.users.find_one({"email": data.email}, {"_id": 0})
-    if not user or not verify_password(data.password, user["password"]):
+    if not user or not await password_hasher.verify(data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    user.pop("password")
     token = create_token(user["id"])
-    return {"token": token, "user": {k: v for k, v in user.items() if k != "password"}}
+    return ORJSONResponse({"token": token, "user": user})
 
-@api_router.get("/auth/me")
+@api_router.get("/auth/me", response_model=UserOut)
 async def get_me(current_user: dict = Depends(get_current_user)):
-    return {k: v for k, v in current_user.items() if k != "password"}
+    return ORJSONResponse(current_user)
 
 # ── Onboarding ──────────────────────────────────────────
 
@@ -155,9 +900,57 @@ async def onboard_user(data: OnboardingUpdate, current_user: dict = Depends(get_
         {"id": current_user["id"]},
         {"$set": {"job_title": data.job_title, "industry": data.industry, "onboarded": True}}
     )
+    user_cache.invalidate(current_user["id"])
     await log_activity(current_user["id"], "onboarding_complete", f"Onboarded as {data.job_title} in {data.industry}")
     return {"status": "ok"}
 
+# ── Pagination ──────────────────────────────────────────
+
+# Keyset pagination over (user_id, <sort_field> desc, id desc). The body stays a
+# plain list; the opaque cursor for the next page is returned in X-Next-Cursor.
+
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(sort_value: str, doc_id: str) -> str:
+    raw = json.dumps([sort_value, doc_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, doc_id = json.loads(raw)
+        if not isinstance(sort_value, str) or not isinstance(doc_id, str):
+            raise ValueError
+        return sort_value, doc_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def page_query(user_id: str, sort_field: str, cursor: Optional[str]) -> dict:
+    query = {"user_id": user_id}
+    if cursor:
+        sort_value, doc_id = decode_cursor(cursor)
+        query["$or"] = [
+            {sort_field: {"$lt": sort_value}},
+            {sort_field: sort_value, "id": {"$lt": doc_id}},
+        ]
+    return query
+
+async def find_page(collection, user_id: str, sort_field: str, limit: int, cursor: Optional[str],
+                    projection: Optional[dict] = None) -> list:
+    return await collection.find(page_query(user_id, sort_field, cursor), projection or {"_id": 0}) \
+        .sort([(sort_field, -1), ("id", -1)]).limit(limit).to_list(limit)
+
+async def fetch_page(collection, user_id: str, sort_field: str, limit: int, cursor: Optional[str]) -> ORJSONResponse:
+    return page_response(await find_page(collection, user_id, sort_field, limit + 1, cursor), sort_field, limit)
+
+def page_response(docs: list, sort_field: str, limit: int) -> ORJSONResponse:
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1][sort_field], docs[-1]["id"])
+    return ORJSONResponse(docs, headers=headers)
+
 # ── Templates ───────────────────────────────────────────
 
 TEMPLATES = [
@@ -175,22 +968,154 @@ TEMPLATES = [
     {"id": "t12", "name": "Lead scoring automation", "description": "Score incoming leads based on engagement and notify sales team", "category": "sales", "trigger": "New lead activity", "action": "Score + notify team", "time_saved": 50, "icon": "target"},
 ]
 
+# TF-IDF over hashed features (words, word bigrams and character trigrams, which
+# absorb plurals and small typos) of each template's name, description, trigger and
+# action, scored by cosine similarity. Template rows are L2-normalised and stored
+# sparse, as postings lists per feature (template index and weight), so memory grows
+# with the features templates actually use (roughly 8 bytes each), not with
+# templates × TEMPLATE_MATCH_DIM. A query only touches the postings of its own features.
+def hashed_features(text: str, dim: int) -> list:
+    words = re.findall(r"\w+", text.lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return [zlib.crc32(g.encode("utf-8")) % dim for g in grams]
+
+def template_text(template: dict) -> str:
+    return " ".join(template.get(f, "") for f in ("name", "description", "trigger", "action"))
+
+class TemplateMatcher:
+    def __init__(self, templates: list, dim: int):
+        self.templates = templates
+        self.dim = dim
+        rows, cols, counts = self._counts([template_text(t) for t in templates])
+        # (row, feature) pairs are unique, so per-feature counts are document frequencies
+        self.features, df = np.unique(cols, return_counts=True)
+        self.feature_idf = (np.log((1 + len(templates)) / (1 + df)) + 1).astype(np.float32)
+        self.unseen_idf = np.float32(np.log(1 + len(templates)) + 1)
+        weights = self._weigh(rows, cols, counts, len(templates))
+        order = np.lexsort((rows, cols))
+        self.posting_rows = rows[order].astype(np.int32)
+        self.posting_weights = weights[order]
+        self.posting_starts = np.searchsorted(cols[order], np.append(self.features, self.dim))
+
+    def _counts(self, texts: list) -> tuple:
+        keys = np.fromiter((i * self.dim + f for i, text in enumerate(texts) for f in hashed_features(text, self.dim)),
+                           dtype=np.int64)
+        keys, counts = np.unique(keys, return_counts=True)
+        return keys // self.dim, keys % self.dim, counts
+
+    def _lookup(self, cols: np.ndarray) -> tuple:
+        pos = np.minimum(np.searchsorted(self.features, cols), max(len(self.features) - 1, 0))
+        found = self.features[pos] == cols if len(self.features) else np.zeros(len(cols), dtype=bool)
+        return pos, found
+
+    def _weigh(self, rows: np.ndarray, cols: np.ndarray, counts: np.ndarray, n_rows: int) -> np.ndarray:
+        pos, found = self._lookup(cols)
+        idf = np.where(found, self.feature_idf[pos] if len(self.features) else 0, self.unseen_idf)
+        weights = (np.log1p(counts) * idf).astype(np.float32)
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n_rows))
+        return weights / np.maximum(norms[rows], 1e-12).astype(np.float32)
+
+    def scores(self, queries: list) -> np.ndarray:
+        """Cosine similarity of each query against every template, shape (queries, templates)."""
+        n = len(self.templates)
+        rows, cols, counts = self._counts(queries)
+        weights = self._weigh(rows, cols, counts, len(queries))
+        pos, found = self._lookup(cols)
+        rows, weights, pos = rows[found], weights[found], pos[found]
+        starts, lengths = self.posting_starts[pos], self.posting_starts[pos + 1] - self.posting_starts[pos]
+        # Flatten the postings of every query feature into one gather
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        cells = np.repeat(rows, lengths) * n + self.posting_rows[offsets]
+        products = np.repeat(weights, lengths) * self.posting_weights[offsets]
+        return np.bincount(cells, weights=products, minlength=len(queries) * n).reshape(len(queries), n)
+
+    def search(self, query: str, limit: int, min_score: float = 0.0) -> list:
+        if not self.templates:
+            return []
+        row = self.scores([query])[0]
+        top = np.argsort(-row)[:limit]
+        return [(self.templates[i], float(row[i])) for i in top if row[i] >= min_score]
+
+    def best(self, query: str) -> tuple:
+        found = self.search(query, 1)
+        return found[0] if found else (None, 0.0)
+
+# Indexes templates by id and category and pre-encodes each category's response
+# body once, so /templates is a dict lookup plus a byte copy regardless of size.
+class TemplateCatalog:
+    def __init__(self, templates: list):
+        self.load(templates)
+
+    @staticmethod
+    def _encode(items: list) -> tuple:
+        body = json.dumps(items, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    def load(self, templates: list):
+        by_category = {}
+        for t in templates:
+            by_category.setdefault(t["category"], []).append(t)
+        encoded = {category: self._encode(items) for category, items in by_category.items()}
+        encoded["all"] = self._encode(templates)
+        # Swap everything at once so concurrent readers never see a half-built catalog
+        matcher = TemplateMatcher(list(templates), TEMPLATE_MATCH_DIM)
+        self.templates, self.by_id, self.by_category, self._encoded, self.matcher = (
+            list(templates), {t["id"]: t for t in templates}, by_category, encoded, matcher)
+        self._empty = self._encode([])
+
+    def get(self, template_id: Optional[str]) -> Optional[dict]:
+        return self.by_id.get(template_id)
+
+    def encoded(self, category: Optional[str]) -> tuple:
+        return self._encoded.get(category or "all", self._empty)
+
+    def load_file(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            self.load(json.load(f))
+        logger.info(f"Loaded {len(self.templates)} templates from {path}")
+
+    async def load_collection(self, name: str):
+        templates = await db[name].find({}, {"_id": 0}).to_list(None)
+        if templates:
+            self.load(templates)
+            logger.info(f"Loaded {len(templates)} templates from collection {name}")
+
+template_catalog = TemplateCatalog(TEMPLATES)
+if TEMPLATES_FILE:
+    template_catalog.load_file(TEMPLATES_FILE)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
 @api_router.get("/templates")
-async def get_templates(category: Optional[str] = None):
-    if category and category != "all":
-        return [t for t in TEMPLATES if t["category"] == category]
-    return TEMPLATES
+async def get_templates(category: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
+    body, etag = template_catalog.encoded(category)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@api_router.get("/templates/search")
+async def search_templates(q: str = Query(..., min_length=1, max_length=500), limit: int = Query(5, ge=1, le=50)):
+    matches = template_catalog.matcher.search(q, limit, TEMPLATE_SEARCH_MIN_SCORE)
+    return ORJSONResponse([{**t, "score": round(score, 4)} for t, score in matches])
 
 # ── Automations CRUD ────────────────────────────────────
 
-@api_router.post("/automations")
-async def create_automation(data: AutomationCreate, current_user: dict = Depends(get_current_user)):
+def build_automation(data: AutomationCreate, user_id: str) -> dict:
     auto_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc).isoformat()
     
     # If from template, get template data
     template_data = {}
     if data.template_id:
-        template = next((t for t in TEMPLATES if t["id"] == data.template_id), None)
+        template = template_catalog.get(data.template_id)
         if template:
             template_data = {"trigger": template["trigger"], "action": template["action"], "time_saved_minutes": template["time_saved"]}
     
@@ -206,81 +1131,1293 @@ async def create_automation(data: AutomationCreate, current_user: dict = Depends
         "nodes": data.nodes or [],
         "tasks_run": 0,
         "time_saved_minutes": template_data.get("time_saved_minutes", 10),
-        "user_id": current_user["id"],
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "minutes_saved": 0,
+        "version": 1,
+        "user_id": user_id,
+        "created_at": now,
+        "updated_at": now,
     }
+    return doc
+
+@api_router.post("/automations", response_model=AutomationOut)
+async def create_automation(data: AutomationCreate, current_user: dict = Depends(get_current_user)):
+    doc = build_automation(data, current_user["id"])
     await db.automations.insert_one(doc)
+    await apply_stats_delta(current_user["id"], automations=1, active=1, time_saved_minutes=doc["time_saved_minutes"])
+    scheduler.upsert(doc)
     await log_activity(current_user["id"], "automation_created", f"Created: {data.name}")
-    return {k: v for k, v in doc.items() if k != "_id"}
+    doc.pop("_id", None)
+    return ORJSONResponse(doc)
 
-@api_router.get("/automations")
-async def get_automations(current_user: dict = Depends(get_current_user)):
-    automations = await db.automations.find({"user_id": current_user["id"]}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return automations
+@api_router.get("/automations", response_model=List[AutomationOut])
+async def get_automations(
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    return await fetch_page(db.automations, current_user["id"], "created_at", limit, cursor)
 
 @api_router.put("/automations/{auto_id}/toggle")
 async def toggle_automation(auto_id: str, current_user: dict = Depends(get_current_user)):
-    auto = await db.automations.find_one({"id": auto_id, "user_id": current_user["id"]}, {"_id": 0})
+    # Flip in one atomic update, so concurrent toggles each apply (and log) a real
+    # transition and the response is the status this request actually left behind
+    flip = {"$cond": [{"$eq": ["$status", "active"]}, "paused", "active"]}
+    auto = await db.automations.find_one_and_update(
+        {"id": auto_id, "user_id": current_user["id"]},
+        [{"$set": {"status": flip, "updated_at": datetime.now(timezone.utc).isoformat()}}],
+        projection={"_id": 0, "id": 1, "name": 1, "status": 1, "trigger": 1},
+        return_document=ReturnDocument.AFTER,
+    )
     if not auto:
         raise HTTPException(status_code=404, detail="Automation not found")
-    new_status = "paused" if auto["status"] == "active" else "active"
-    await db.automations.update_one({"id": auto_id}, {"$set": {"status": new_status}})
+    new_status = auto["status"]
+    await apply_stats_delta(current_user["id"], active=1 if new_status == "active" else -1)
+    scheduler.upsert(auto)
     await log_activity(current_user["id"], "automation_toggled", f"{auto['name']} → {new_status}")
     return {"status": new_status}
 
 @api_router.delete("/automations/{auto_id}")
 async def delete_automation(auto_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.automations.delete_one({"id": auto_id, "user_id": current_user["id"]})
-    if result.deleted_count == 0:
+    deleted = await db.automations.find_one_and_delete(
+        {"id": auto_id, "user_id": current_user["id"]},
+        projection={"_id": 0, "status": 1, "tasks_run": 1, "time_saved_minutes": 1, "minutes_saved": 1},
+    )
+    if not deleted:
         raise HTTPException(status_code=404, detail="Automation not found")
+    scheduler.remove(auto_id)
+    await apply_stats_delta(
+        current_user["id"],
+        automations=-1,
+        active=-1 if deleted.get("status") == "active" else 0,
+        tasks_run=-deleted.get("tasks_run", 0),
+        time_saved_minutes=-deleted.get("time_saved_minutes", 0),
+        minutes_saved=-deleted.get("minutes_saved", 0),
+    )
     await log_activity(current_user["id"], "automation_deleted", f"Deleted automation {auto_id}")
     return {"status": "deleted"}
 
+# ── Bulk automation operations ──────────────────────────
+
+@api_router.post("/automations/bulk", response_model=List[AutomationOut])
+async def bulk_create_automations(data: AutomationBulkCreate, current_user: dict = Depends(get_current_user)):
+    user_id = current_user["id"]
+    docs = [build_automation(item, user_id) for item in data.automations]
+    await db.automations.insert_many(docs)
+    await apply_stats_delta(user_id, automations=len(docs), active=len(docs), time_saved_minutes=sum(d["time_saved_minutes"] for d in docs))
+    for doc in docs:
+        doc.pop("_id", None)
+        scheduler.upsert(doc)
+    await log_activities(user_id, [("automation_created", f"Created: {d['name']}") for d in docs])
+    return ORJSONResponse(docs)
+
+@api_router.post("/automations/bulk/status")
+async def bulk_set_status(data: AutomationBulkStatus, current_user: dict = Depends(get_current_user)):
+    user_id = current_user["id"]
+    # Only documents not already in the target status change, so the modified count
+    # is exactly the change in active automations even under concurrent writers.
+    match = {"id": {"$in": data.ids}, "user_id": user_id, "status": {"$ne": data.status}}
+    changing = await db.automations.find(match, {"_id": 0, "id": 1, "name": 1, "trigger": 1}).to_list(None)
+    if not changing:
+        return {"status": data.status, "updated": 0}
+    result = await db.automations.update_many({**match, "id": {"$in": [a["id"] for a in changing]}}, {"$set": {"status": data.status, "updated_at": datetime.now(timezone.utc).isoformat()}})
+    await apply_stats_delta(user_id, active=result.modified_count if data.status == "active" else -result.modified_count)
+    if result.modified_count != len(changing):
+        # A concurrent writer changed or deleted some of them in between; re-read which
+        # ones actually ended up in the target status before logging and rescheduling
+        landed = await db.automations.find(
+            {"id": {"$in": [a["id"] for a in changing]}, "user_id": user_id, "status": data.status}, {"_id": 0, "id": 1}
+        ).to_list(None)
+        landed_ids = {a["id"] for a in landed}
+        changing = [a for a in changing if a["id"] in landed_ids]
+    for auto in changing:
+        scheduler.upsert({**auto, "status": data.status})
+    await log_activities(user_id, [("automation_toggled", f"{a['name']} → {data.status}") for a in changing])
+    return {"status": data.status, "updated": result.modified_count}
+
+@api_router.post("/automations/bulk/delete")
+async def bulk_delete_automations(data: AutomationBulkDelete, current_user: dict = Depends(get_current_user)):
+    user_id = current_user["id"]
+    projection = {"_id": 0, "id": 1, "status": 1, "tasks_run": 1, "time_saved_minutes": 1, "minutes_saved": 1}
+    found = await db.automations.find({"id": {"$in": data.ids}, "user_id": user_id}, projection).to_list(None)
+    if not found:
+        return {"status": "deleted", "deleted": 0}
+    ids = [a["id"] for a in found]
+    result = await db.automations.delete_many({"id": {"$in": ids}, "user_id": user_id})
+    if result.deleted_count == len(found):
+        await apply_stats_delta(
+            user_id,
+            automations=-len(found),
+            active=-sum(1 for a in found if a.get("status") == "active"),
+            tasks_run=-sum(a.get("tasks_run", 0) for a in found),
+            time_saved_minutes=-sum(a.get("time_saved_minutes", 0) for a in found),
+            minutes_saved=-sum(a.get("minutes_saved", 0) for a in found),
+        )
+    else:
+        # A concurrent delete removed some of them first; recount rather than guess
+        await rebuild_user_stats(user_id)
+    for auto_id in ids:
+        scheduler.remove(auto_id)
+    await log_activities(user_id, [("automation_deleted", f"Deleted automation {i}") for i in ids])
+    return {"status": "deleted", "deleted": result.deleted_count}
+
 # ── Dashboard stats ─────────────────────────────────────
 
-@api_router.get("/dashboard/stats")
-async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
-    automations = await db.automations.find({"user_id": current_user["id"]}, {"_id": 0}).to_list(100)
-    active_count = sum(1 for a in automations if a.get("status") == "active")
-    total_tasks = sum(a.get("tasks_run", 0) for a in automations)
-    total_time_saved = sum(a.get("time_saved_minutes", 0) for a in automations)
-    hours_saved = round(total_time_saved / 60, 1)
+# One user_stats document per user (_id = user id), kept current with $inc by
+# every automation write. The aggregation below is the source of truth used to
+# seed missing documents and to repair drift (see `python server.py rebuild-stats`).
+
+# time_saved_minutes sums each automation's per-run estimate; minutes_saved sums
+# what completed runs actually saved.
+STATS_FIELDS = ("automations", "active", "tasks_run", "time_saved_minutes", "minutes_saved")
+
+def stats_pipeline(match: dict) -> list:
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": "$user_id",
+            "automations": {"$sum": 1},
+            "active": {"$sum": {"$cond": [{"$eq": ["$status", "active"]}, 1, 0]}},
+            "tasks_run": {"$sum": {"$ifNull": ["$tasks_run", 0]}},
+            "time_saved_minutes": {"$sum": {"$ifNull": ["$time_saved_minutes", 0]}},
+            "minutes_saved": {"$sum": {"$ifNull": ["$minutes_saved", 0]}},
+        }},
+    ]
+
+async def rebuild_user_stats(user_id: str) -> dict:
+    rows = await db.automations.aggregate(stats_pipeline({"user_id": user_id})).to_list(1)
+    stats = {f: (rows[0][f] if rows else 0) for f in STATS_FIELDS}
+    await db.user_stats.replace_one({"_id": user_id}, {**stats, "rebuilt_at": datetime.now(timezone.utc).isoformat()}, upsert=True)
+    return stats
+
+async def rebuild_all_user_stats() -> int:
+    stamp = datetime.now(timezone.utc).isoformat()
+    count = 0
+    async for row in db.automations.aggregate(stats_pipeline({})):
+        stats = {f: row[f] for f in STATS_FIELDS}
+        await db.user_stats.replace_one({"_id": row["_id"]}, {**stats, "rebuilt_at": stamp}, upsert=True)
+        count += 1
+    # Users whose automations are all gone are re-seeded lazily on next read
+    await db.user_stats.delete_many({"rebuilt_at": {"$ne": stamp}})
+    return count
+
+async def apply_stats_delta(user_id: str, **delta):
+    inc = {k: v for k, v in delta.items() if v}
+    if not inc:
+        return
+    result = await db.user_stats.update_one({"_id": user_id}, {"$inc": inc})
+    if result.matched_count == 0:
+        # No counters yet (new user or pre-existing data): seed from the source of truth,
+        # which already reflects the write that triggered this delta.
+        await rebuild_user_stats(user_id)
+
+async def get_user_stats(user_id: str) -> dict:
+    stats = await db.user_stats.find_one({"_id": user_id}, {"_id": 0, "rebuilt_at": 0})
+    if stats is None:
+        stats = await rebuild_user_stats(user_id)
+    return stats
+
+def dashboard_stats(stats: dict) -> dict:
+    hours_saved = round(stats.get("time_saved_minutes", 0) / 60, 1)
     productivity_value = round(hours_saved * 150, 2)  # $150/hour value
     return {
-        "active_automations": active_count,
-        "total_automations": len(automations),
-        "tasks_run": total_tasks,
+        "active_automations": stats.get("active", 0),
+        "total_automations": stats.get("automations", 0),
+        "tasks_run": stats.get("tasks_run", 0),
         "hours_saved": hours_saved,
         "productivity_value": productivity_value,
+        "hours_saved_by_runs": round(stats.get("minutes_saved", 0) / 60, 1),
     }
 
+@api_router.get("/dashboard/stats")
+async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
+    return dashboard_stats(await get_user_stats(current_user["id"]))
+
 # ── Activity Log ────────────────────────────────────────
 
-async def log_activity(user_id: str, action: str, detail: str):
+# Buffers documents in memory and writes them to one collection with insert_many,
+# either every flush interval or as soon as a full batch is queued. When the buffer
+# is full, submit() waits for space (backpressure) and offer() refuses the document.
+# A batch that fails to write stays at the head and is retried with exponential
+# backoff, so while the database is down the buffer fills and callers are pushed back
+# rather than their documents being lost. Documents the database rejects individually
+# (a partial BulkWriteError) are the only ones dropped.
+class BatchWriter:
+    def __init__(self, collection: str, max_buffer: int, batch_size: int, interval: float):
+        self.collection = collection
+        self.capacity = max_buffer
+        self.batch_size = batch_size
+        self.interval = interval
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self._pending: list = []
+        self._attempts = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffer)
+        self._wake = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closing
+
+    def start(self):
+        if self._task is None:
+            # stop() drained the old queue; fresh primitives bind to this lifespan's loop
+            self._queue = asyncio.Queue(maxsize=self.capacity)
+            self._wake = asyncio.Event()
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._closing = True
+        self._wake.set()
+        await self._task
+        self._task = None
+
+    async def submit(self, doc: dict):
+        if self._queue.qsize() + 1 >= self.batch_size:
+            self._wake.set()
+        await self._queue.put(doc)
+
+    def offer(self, doc: dict) -> bool:
+        try:
+            self._queue.put_nowait(doc)
+        except asyncio.QueueFull:
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    async def _run(self):
+        while not self._closing or self._pending or not self._queue.empty():
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if await self.flush():
+                continue
+            if self._closing:
+                # Shutting down with the database unreachable: don't hold up the lifespan
+                lost = len(self._pending) + self._queue.qsize()
+                self.failed += lost
+                self._pending = []
+                while not self._queue.empty():
+                    self._queue.get_nowait()
+                logger.error(f"{self.collection} writer stopped with the database unavailable, dropped {lost} entries")
+                return
+            await asyncio.sleep(min(self.interval * 2 ** self._attempts, WRITE_RETRY_MAX_DELAY))
+
+    async def flush(self) -> bool:
+        """Write everything buffered; False if a batch failed and is waiting to be retried."""
+        while self._pending or not self._queue.empty():
+            if not self._pending:
+                while len(self._pending) < self.batch_size and not self._queue.empty():
+                    self._pending.append(self._queue.get_nowait())
+            try:
+                await db[self.collection].insert_many(self._pending, ordered=False)
+                self.written += len(self._pending)
+            except BulkWriteError as e:
+                # ordered=False: everything but the rejected documents was written. insert_many
+                # assigns _id in place, so a duplicate key here is a retried document that
+                # already made it in before the earlier attempt failed.
+                errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+                self.written += len(self._pending) - len(errors)
+                if errors:
+                    self.failed += len(errors)
+                    logger.error(f"{self.collection} flush rejected {len(errors)} entries: {errors[0].get('errmsg')}")
+            except Exception as e:
+                self._attempts += 1
+                self.retries += 1
+                logger.warning(f"{self.collection} flush failed (attempt {self._attempts}), retrying {len(self._pending)} entries: {e}")
+                return False
+            self._pending = []
+            self._attempts = 0
+        return True
+
+    def stats(self) -> dict:
+        return {"buffered": self._queue.qsize() + len(self._pending), "written": self.written, "failed": self.failed, "retries": self.retries}
+
+activity_writer = BatchWriter("activity_log", ACTIVITY_BUFFER_SIZE, ACTIVITY_BATCH_SIZE, ACTIVITY_FLUSH_INTERVAL)
+
+async def log_activity(user_id: str, action: str, detail: str, durable: bool = False):
+    await log_activities(user_id, [(action, detail)], durable)
+
+async def log_activities(user_id: str, entries: list, durable: bool = False):
+    now = datetime.now(timezone.utc)
+    timestamp = now.isoformat()
+    # logged_at is the real date the retention TTL index keys on; timestamp stays the API field
+    docs = [
+        {"id": str(uuid.uuid4()), "user_id": user_id, "action": action, "detail": detail, "timestamp": timestamp, "logged_at": now}
+        for action, detail in entries
+    ]
+    if durable or not ACTIVITY_WRITE_BEHIND or not activity_writer.running:
+        await db.activity_log.insert_many(docs)
+    else:
+        for doc in docs:
+            await activity_writer.submit(doc)
+
+@api_router.get("/activity")
+async def get_activity(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    docs = await find_page(db.activity_log, current_user["id"], "timestamp", limit + 1, cursor, ACTIVITY_PROJECTION)
+    if len(docs) <= limit:
+        # The page ran past the hot window: continue seamlessly from the archive
+        resume = encode_cursor(docs[-1]["timestamp"], docs[-1]["id"]) if docs else cursor
+        docs += await read_archived_activity(current_user["id"], limit + 1 - len(docs), resume)
+    return page_response(docs, "timestamp", limit)
+
+# ── Activity retention ──────────────────────────────────
+
+# activity_log only holds the hot window (ACTIVITY_HOT_DAYS). The archiver moves older
+# rows, oldest first, into activity_archive: zlib-compressed JSON chunks of up to
+# ACTIVITY_ARCHIVE_CHUNK rows, partitioned by user and day, so RAM and index size
+# stay flat as the product ages. The TTL index on logged_at is the backstop. With
+# archiving on it fires ACTIVITY_ARCHIVE_GRACE_DAYS later than the archiver would, so
+# rows are only lost if the archiver is down for that long. With archiving off it
+# simply enforces the hot window. Rows written before logged_at existed need
+# `python server.py backfill-activity-dates` once before they are archived or expired.
+ACTIVITY_PROJECTION = {"_id": 0, "logged_at": 0}
+ACTIVITY_TTL_SECONDS = int((ACTIVITY_HOT_DAYS + (ACTIVITY_ARCHIVE_GRACE_DAYS if ACTIVITY_ARCHIVE else 0)) * 86400)
+archive_stats = {"archived": 0, "chunks": 0, "last_run": None}
+
+def archive_chunk(user_id: str, rows: list) -> ReplaceOne:
+    # Keyed by the first row so re-archiving the same rows after a crash overwrites the chunk
     doc = {
-        "id": str(uuid.uuid4()),
         "user_id": user_id,
-        "action": action,
-        "detail": detail,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "day": rows[0]["timestamp"][:10],
+        "oldest": rows[0]["timestamp"],
+        "newest": rows[-1]["timestamp"],
+        "count": len(rows),
+        "rows": Binary(zlib.compress(orjson.dumps(rows))),
     }
-    await db.activity_log.insert_one(doc)
+    return ReplaceOne({"_id": f"{user_id}:{rows[0]['id']}"}, doc, upsert=True)
 
-@api_router.get("/activity")
-async def get_activity(current_user: dict = Depends(get_current_user)):
-    logs = await db.activity_log.find({"user_id": current_user["id"]}, {"_id": 0}).sort("timestamp", -1).to_list(50)
-    return logs
+async def archive_activity_batch(cutoff: datetime) -> int:
+    docs = await db.activity_log.find({"logged_at": {"$lt": cutoff}}) \
+        .sort("logged_at", 1).limit(ACTIVITY_ARCHIVE_BATCH).to_list(ACTIVITY_ARCHIVE_BATCH)
+    if not docs:
+        return 0
+    partitions = {}
+    for doc in docs:
+        row = {k: v for k, v in doc.items() if k not in ("_id", "logged_at")}
+        partitions.setdefault((doc["user_id"], doc["timestamp"][:10]), []).append(row)
+    chunks = [
+        archive_chunk(user_id, rows[i:i + ACTIVITY_ARCHIVE_CHUNK])
+        for (user_id, _), rows in partitions.items()
+        for i in range(0, len(rows), ACTIVITY_ARCHIVE_CHUNK)
+    ]
+    await db.activity_archive.bulk_write(chunks, ordered=False)
+    await db.activity_log.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+    archive_stats["archived"] += len(docs)
+    archive_stats["chunks"] += len(chunks)
+    return len(docs)
 
-# ── AI Suggest ──────────────────────────────────────────
+async def archive_activity():
+    now = datetime.now(timezone.utc)
+    # One replica per interval: concurrent archivers would write the same chunks twice
+    slot = int(now.timestamp() // ACTIVITY_ARCHIVE_INTERVAL)
+    try:
+        await db.schedule_leases.insert_one({"_id": f"activity-archive@{slot}", "claimed_at": now})
+    except DuplicateKeyError:
+        return
+    cutoff = now - timedelta(days=ACTIVITY_HOT_DAYS)
+    archived = 0
+    while True:
+        moved = await archive_activity_batch(cutoff)
+        archived += moved
+        if moved < ACTIVITY_ARCHIVE_BATCH:
+            break
+    archive_stats["last_run"] = now.isoformat()
+    if archived:
+        logger.info(f"Archived {archived} activity rows older than {cutoff.isoformat()}")
 
-@api_router.post("/ai/suggest")
-async def ai_suggest(data: AIRequest, current_user: dict = Depends(get_current_user)):
+async def run_activity_archiver():
+    while True:
+        try:
+            await archive_activity()
+        except Exception as e:
+            logger.error(f"Activity archiving failed: {e}")
+        await asyncio.sleep(ACTIVITY_ARCHIVE_INTERVAL)
+
+async def read_archived_activity(user_id: str, limit: int, cursor: Optional[str]) -> list:
+    query = {"user_id": user_id}
+    before = decode_cursor(cursor) if cursor else None
+    if before:
+        query["oldest"] = {"$lte": before[0]}
+    rows = []
+    async for chunk in db.activity_archive.find(query, {"_id": 0, "newest": 1, "rows": 1}).sort("newest", -1):
+        # Chunks of one user can share boundary timestamps, so stop only once the next
+        # chunk is entirely older than the last row we need
+        if len(rows) >= limit and chunk["newest"] < rows[limit - 1]["timestamp"]:
+            break
+        for row in orjson.loads(zlib.decompress(chunk["rows"])):
+            if before is None or (row["timestamp"], row["id"]) < before:
+                rows.append(row)
+        rows.sort(key=lambda r: (r["timestamp"], r["id"]), reverse=True)
+    return rows[:limit]
+
+async def backfill_activity_dates() -> int:
+    updated = 0
+    while True:
+        docs = await db.activity_log.find({"logged_at": {"$exists": False}}, {"_id": 1, "timestamp": 1}) \
+            .limit(ACTIVITY_ARCHIVE_BATCH).to_list(ACTIVITY_ARCHIVE_BATCH)
+        if not docs:
+            return updated
+        await db.activity_log.bulk_write([
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"logged_at": datetime.fromisoformat(doc["timestamp"])}})
+            for doc in docs
+        ], ordered=False)
+        updated += len(docs)
+
+# ── Export ──────────────────────────────────────────────
+
+# NDJSON, oldest first, one batch of EXPORT_BATCH_SIZE rows per chunk, so worker memory
+# stays flat however many rows a user has. An activity export first streams the
+# user's archived chunks, one decompressed chunk at a time, then the hot rows. Every
+# row carries its own _cursor, built with encode_cursor(sort value, id) exactly like
+# the X-Next-Cursor of the paged endpoints; an interrupted export resumes with
+# cursor=<_cursor of the last row received>, which needs no lookup and works for
+# archived rows too. since/until must carry a UTC offset. Concurrent exports per
+# worker are capped.
+EXPORTS = {
+    "automations": ("automations", "created_at", {"_id": 0}),
+    "activity": ("activity_log", "timestamp", ACTIVITY_PROJECTION),
+}
+exports_in_flight = 0
+
+class ExportSlot:
+    # Taken before the response is returned, so a burst cannot pass the cap. Released by
+    # the body generator, or by the response's background task if the client left
+    # before the body started; whichever runs first wins.
+    def __init__(self):
+        global exports_in_flight
+        exports_in_flight += 1
+        self.held = True
+
+    def release(self):
+        global exports_in_flight
+        if self.held:
+            self.held = False
+            exports_in_flight -= 1
+
+def export_query(user_id: str, sort_field: str, since: Optional[datetime],
+                 until: Optional[datetime], after: Optional[tuple]) -> dict:
+    conditions = []
+    if since:
+        conditions.append({sort_field: {"$gte": since.astimezone(timezone.utc).isoformat()}})
+    if until:
+        conditions.append({sort_field: {"$lt": until.astimezone(timezone.utc).isoformat()}})
+    if after:
+        sort_value, doc_id = after
+        conditions.append({"$or": [
+            {sort_field: {"$gt": sort_value}},
+            {sort_field: sort_value, "id": {"$gt": doc_id}},
+        ]})
+    query = {"user_id": user_id}
+    if conditions:
+        query["$and"] = conditions
+    return query
+
+async def archived_export_rows(user_id: str, since: Optional[datetime], until: Optional[datetime],
+                               after: Optional[tuple]):
+    since_ts = since.astimezone(timezone.utc).isoformat() if since else ""
+    until_ts = until.astimezone(timezone.utc).isoformat() if until else None
+    if after and after[0] > since_ts:
+        since_ts = after[0]
+    query = {"user_id": user_id}
+    if since_ts:
+        query["newest"] = {"$gte": since_ts}
+    if until_ts:
+        query["oldest"] = {"$lt": until_ts}
+    def wanted(row: dict) -> bool:
+        return (row["timestamp"] >= since_ts and (until_ts is None or row["timestamp"] < until_ts)
+                and (after is None or (row["timestamp"], row["id"]) > after))
+    pending = []
+    async for chunk in db.activity_archive.find(query, {"_id": 0, "oldest": 1, "rows": 1}).sort("oldest", 1):
+        # Neighbouring chunks can share a boundary timestamp, so a row is only final
+        # once a chunk starting after it has been read
+        ready = sorted((r for r in pending if r["timestamp"] < chunk["oldest"]), key=lambda r: (r["timestamp"], r["id"]))
+        pending = [r for r in pending if r["timestamp"] >= chunk["oldest"]]
+        pending.extend(r for r in orjson.loads(zlib.decompress(chunk["rows"])) if wanted(r))
+        for row in ready:
+            yield row
+    for row in sorted(pending, key=lambda r: (r["timestamp"], r["id"])):
+        yield row
+
+async def export_docs(sources: list):
+    for source in sources:
+        async for doc in source:
+            yield doc
+
+async def export_rows(kind: str, sources: list, compress: bool, slot: ExportSlot):
+    sort_field = EXPORTS[kind][1]
+    encoder = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    batch = []
     try:
-        from emergentintegrations.llm.chat import LlmChat, UserMessage
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"flowforge-{current_user['id']}-{uuid.uuid4()}",
-            system_message="""You are Flow-Forge AI, an automation assistant. When the user describes a task they want automated, respond with a JSON object containing:
+        async for doc in export_docs(sources):
+            doc["_cursor"] = encode_cursor(doc[sort_field], doc["id"])
+            batch.append(orjson.dumps(doc, default=str))
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                chunk = b"\n".join(batch) + b"\n"
+                EXPORT_ROWS.inc((kind,), len(batch))
+                batch = []
+                if encoder:
+                    chunk = encoder.compress(chunk)
+                if chunk:
+                    yield chunk
+        chunk = b"\n".join(batch) + b"\n" if batch else b""
+        EXPORT_ROWS.inc((kind,), len(batch))
+        if encoder:
+            chunk = encoder.compress(chunk) + encoder.flush()
+        if chunk:
+            yield chunk
+    finally:
+        slot.release()
+        for source in sources:
+            await (source.aclose() if hasattr(source, "aclose") else source.close())
+
+@api_router.get("/export/{kind}")
+async def export(
+    kind: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    gzip: bool = False,
+    current_user: dict = Depends(get_current_user),
+):
+    if kind not in EXPORTS:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    if any(bound and bound.tzinfo is None for bound in (since, until)):
+        # A naive time would silently be read in the server's local zone
+        raise HTTPException(status_code=400, detail="since and until need a UTC offset, e.g. 2026-10-01T00:00:00Z")
+    name, sort_field, projection = EXPORTS[kind]
+    collection = db[name]
+    after = decode_cursor(cursor) if cursor else None
+    query = export_query(current_user["id"], sort_field, since, until, after)
+    if exports_in_flight >= EXPORT_MAX_CONCURRENCY:
+        raise HTTPException(status_code=503, detail="Too many exports in progress, retry shortly", headers={"Retry-After": "5"})
+    slot = ExportSlot()
+    sources = [collection.find(query, projection).sort([(sort_field, 1), ("id", 1)]).batch_size(EXPORT_BATCH_SIZE)]
+    if kind == "activity":
+        # Everything archived is older than the hot window, so it goes first
+        sources.insert(0, archived_export_rows(current_user["id"], since, until, after))
+    filename = f"flowforge-{kind}.ndjson" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_rows(kind, sources, gzip, slot),
+        background=BackgroundTask(slot.release),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
+
+# ── Automation runs ─────────────────────────────────────
+
+# Node handlers take (value, context) and return a JSON-able result; context carries
+# the trigger payload and the outputs of earlier steps. The built-ins are local
+# stand-ins until real integrations are registered with register_node_handler().
+
+NODE_HANDLERS = {}
+
+def register_node_handler(node_type: str, handler):
+    NODE_HANDLERS[node_type] = handler
+
+async def run_trigger_node(value: str, context: dict) -> dict:
+    return {"trigger": value, "payload": context.get("payload") or {}}
+
+async def run_action_node(value: str, context: dict) -> dict:
+    return {"action": value, "simulated": True}
+
+register_node_handler("trigger", run_trigger_node)
+register_node_handler("action", run_action_node)
+
+class PlanError(Exception):
+    pass
+
+def compile_plan(automation: dict) -> tuple:
+    nodes = automation.get("nodes") or [
+        {"type": "trigger", "value": automation.get("trigger", "")},
+        {"type": "action", "value": automation.get("action", "")},
+    ]
+    steps = []
+    for node in nodes:
+        handler = NODE_HANDLERS.get(node.get("type"))
+        if handler is None:
+            raise PlanError(f"Unknown node type: {node.get('type')}")
+        steps.append((node["type"], node.get("value", ""), handler))
+    return tuple(steps)
+
+# Compiled plans keyed by (automation id, version): editing an automation bumps its
+# version, so stale plans are never reused and simply age out of the LRU.
+class PlanCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._plans: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    def get(self, automation: dict) -> tuple:
+        key = (automation["id"], automation.get("version", 1))
+        plan = self._plans.get(key)
+        if plan is not None:
+            self._plans.move_to_end(key)
+            self.hits += 1
+            return plan
+        self.misses += 1
+        plan = compile_plan(automation)
+        self._plans[key] = plan
+        while len(self._plans) > self.maxsize:
+            self._plans.popitem(last=False)
+        return plan
+
+class AutomationRunner:
+    def __init__(self, workers: int, max_queue: int, node_timeout: float, plans: PlanCache):
+        self.capacity = workers + max_queue
+        self.node_timeout = node_timeout
+        self.plans = plans
+        self.pending = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.workers = workers
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._completed = deque()
+        self._background = set()
+
+    def start(self):
+        self._semaphore = asyncio.Semaphore(self.workers)
+
+    def free(self) -> int:
+        return max(0, self.capacity - self.pending)
+
+    def _admit(self) -> bool:
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            return False
+        self.pending += 1
+        return True
+
+    async def run(self, automation: dict, payload: Optional[dict] = None, source: str = "manual") -> dict:
+        if not self._admit():
+            raise HTTPException(status_code=503, detail="Run queue full, retry shortly", headers={"Retry-After": "1"})
+        return await self._run_admitted(automation, payload, source)
+
+    async def _run_admitted(self, automation: dict, payload: Optional[dict], source: str) -> dict:
+        try:
+            async with self._semaphore:
+                return await self._execute(automation, payload, source)
+        finally:
+            self.pending -= 1
+
+    def submit(self, automation: dict, payload: Optional[dict] = None, source: str = "manual") -> Optional[asyncio.Task]:
+        """Run in the background. Returns None, without queueing anything, when the runner is full."""
+        if not self._admit():
+            return None
+        task = asyncio.create_task(self._run_admitted(automation, payload, source))
+        self._background.add(task)
+        task.add_done_callback(self._finished)
+        return task
+
+    def _finished(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background run failed: {task.exception()}")
+
+    async def _execute(self, automation: dict, payload: Optional[dict], source: str) -> dict:
+        started = time.perf_counter()
+        run = {
+            "id": str(uuid.uuid4()),
+            "automation_id": automation["id"],
+            "user_id": automation["user_id"],
+            "version": automation.get("version", 1),
+            "source": source,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "steps": [],
+        }
+        context = {"payload": payload, "outputs": []}
+        try:
+            for node_type, value, handler in self.plans.get(automation):
+                step_started = time.perf_counter()
+                step = {"type": node_type, "value": value}
+                try:
+                    step["output"] = await asyncio.wait_for(handler(value, context), self.node_timeout)
+                    step["status"] = "succeeded"
+                except asyncio.TimeoutError:
+                    step["status"], step["error"] = "failed", f"Timed out after {self.node_timeout}s"
+                except Exception as e:
+                    step["status"], step["error"] = "failed", str(e)
+                step["duration_ms"] = round((time.perf_counter() - step_started) * 1000, 2)
+                run["steps"].append(step)
+                if step["status"] == "failed":
+                    raise PlanError(f"Step {len(run['steps'])} ({node_type}) failed: {step['error']}")
+                context["outputs"].append(step["output"])
+            run["status"] = "succeeded"
+        except PlanError as e:
+            run["status"], run["error"] = "failed", str(e)
+        run["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        await self._record(automation, run)
+        return run
+
+    async def _record(self, automation: dict, run: dict):
+        # recorded_at is the real date the RUN_RETENTION_DAYS TTL index keys on
+        await db.automation_runs.insert_one({**run, "recorded_at": datetime.now(timezone.utc)})
+        if run["status"] == "succeeded":
+            self.succeeded += 1
+            saved = automation.get("time_saved_minutes", 0)
+            await db.automations.update_one({"id": automation["id"]}, {"$inc": {"tasks_run": 1, "minutes_saved": saved}})
+            await apply_stats_delta(automation["user_id"], tasks_run=1, minutes_saved=saved)
+        else:
+            self.failed += 1
+        await record_run_metrics(automation, run)
+        now = time.monotonic()
+        self._completed.append(now)
+        while self._completed and self._completed[0] < now - 60:
+            self._completed.popleft()
+        await log_activity(automation["user_id"], "automation_run", f"{automation['name']} → {run['status']}")
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "capacity": self.capacity,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "runs_per_sec_1m": round(len(self._completed) / 60, 3),
+            "plan_cache": {"hits": self.plans.hits, "misses": self.plans.misses},
+        }
+
+automation_runner = AutomationRunner(RUN_WORKERS, RUN_QUEUE, RUN_NODE_TIMEOUT, PlanCache(RUN_PLAN_CACHE_SIZE))
+
+class RunRequest(BaseModel):
+    payload: Optional[dict] = None
+
+@api_router.post("/automations/{auto_id}/run")
+async def run_automation(auto_id: str, data: Optional[RunRequest] = None, current_user: dict = Depends(get_current_user)):
+    auto = await db.automations.find_one({"id": auto_id, "user_id": current_user["id"]}, {"_id": 0})
+    if not auto:
+        raise HTTPException(status_code=404, detail="Automation not found")
+    if auto["status"] != "active":
+        raise HTTPException(status_code=409, detail="Automation is paused")
+    run = await automation_runner.run(auto, data.payload if data else None)
+    return ORJSONResponse(run)
+
+# ── Run metrics ─────────────────────────────────────────
+
+# Runs are counted into per-minute buckets for both the automation and its owner
+# (one bulk_write of two $inc upserts). The compactor later rolls minute buckets
+# into hour buckets and hour buckets into day buckets, deleting the fine ones, so
+# each instant is covered by exactly one granularity: minutes for the last couple
+# of hours, hours for the last couple of days, days beyond that. A range query
+# therefore reads at most a few hundred bucket documents however long it is.
+
+METRIC_FIELDS = ("runs", "succeeded", "failed", "minutes_saved", "duration_ms")
+BUCKET_SPANS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+def bucket_start(dt: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return dt.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def metric_id(scope: str, key: str, granularity: str, bucket: datetime) -> str:
+    return f"{scope}:{key}:{granularity}:{bucket:%Y%m%d%H%M}"
+
+async def record_run_metrics(automation: dict, run: dict):
+    bucket = bucket_start(datetime.now(timezone.utc), "minute")
+    succeeded = run["status"] == "succeeded"
+    inc = {
+        "runs": 1,
+        "succeeded": int(succeeded),
+        "failed": int(not succeeded),
+        "minutes_saved": automation.get("time_saved_minutes", 0) if succeeded else 0,
+        "duration_ms": run.get("duration_ms", 0),
+    }
+    ops = [
+        UpdateOne(
+            {"_id": metric_id(scope, key, "minute", bucket)},
+            {"$inc": inc, "$setOnInsert": {"scope": scope, "key": key, "user_id": automation["user_id"], "granularity": "minute", "bucket": bucket}},
+            upsert=True,
+        )
+        for scope, key in (("automation", automation["id"]), ("user", automation["user_id"]))
+    ]
+    try:
+        await db.run_metrics.bulk_write(ops, ordered=False)
+    except Exception as e:
+        logger.error(f"Recording run metrics failed: {e}")
+
+async def roll_up_metrics(fine: str, coarse: str, cutoff: datetime) -> int:
+    # One coarse window at a time, oldest first, so the work per step is bounded by the
+    # number of keys active in that window rather than by the whole backlog. Coarse
+    # buckets are only ever written here and are set to the full sum of their window,
+    # which is then deleted by range (never a giant $in), so a crash between the two
+    # just recomputes the same sums on the next run. Cutoffs are aligned to coarse
+    # boundaries and fine buckets are only written for the current minute (or by the
+    # finer rollup, which runs first), so nothing lands in a window while it is rolled.
+    rolled = 0
+    while True:
+        oldest = await db.run_metrics.find_one(
+            {"granularity": fine, "bucket": {"$lt": cutoff}}, {"_id": 0, "bucket": 1}, sort=[("bucket", 1)]
+        )
+        if oldest is None:
+            return rolled
+        start = bucket_start(oldest["bucket"].replace(tzinfo=timezone.utc), coarse)
+        window = {"granularity": fine, "bucket": {"$gte": start, "$lt": start + BUCKET_SPANS[coarse]}}
+        groups, count = {}, 0
+        projection = {"_id": 0, "scope": 1, "key": 1, "user_id": 1, **{f: 1 for f in METRIC_FIELDS}}
+        async for doc in db.run_metrics.find(window, projection).batch_size(METRICS_COMPACT_BATCH):
+            group = groups.setdefault((doc["scope"], doc["key"]), {"user_id": doc["user_id"], **{f: 0 for f in METRIC_FIELDS}})
+            for f in METRIC_FIELDS:
+                group[f] += doc.get(f, 0)
+            count += 1
+        ops = [
+            UpdateOne(
+                {"_id": metric_id(scope, key, coarse, start)},
+                {"$set": {**group, "scope": scope, "key": key, "granularity": coarse, "bucket": start}},
+                upsert=True,
+            )
+            for (scope, key), group in groups.items()
+        ]
+        for i in range(0, len(ops), METRICS_COMPACT_BATCH):
+            await db.run_metrics.bulk_write(ops[i:i + METRICS_COMPACT_BATCH], ordered=False)
+        await db.run_metrics.delete_many(window)
+        rolled += count
+
+async def compact_metrics():
+    now = datetime.now(timezone.utc)
+    minute_cutoff = bucket_start(now - timedelta(seconds=METRICS_MINUTE_RETENTION), "hour")
+    hour_cutoff = bucket_start(now - timedelta(seconds=METRICS_HOUR_RETENTION), "day")
+    # One replica per cutoff: concurrent compactors would race on the same buckets
+    try:
+        await db.schedule_leases.insert_one({"_id": f"metrics-compaction@{minute_cutoff.isoformat()}", "claimed_at": now})
+    except DuplicateKeyError:
+        return
+    rolled = await roll_up_metrics("minute", "hour", minute_cutoff)
+    rolled += await roll_up_metrics("hour", "day", hour_cutoff)
+    if rolled:
+        logger.info(f"Compacted {rolled} run metric buckets")
+
+async def run_metrics_compactor():
+    while True:
+        try:
+            await compact_metrics()
+        except Exception as e:
+            logger.error(f"Metrics compaction failed: {e}")
+        await asyncio.sleep(METRICS_COMPACT_INTERVAL)
+
+async def read_timeseries(scope: str, key: str, user_id: str, start: datetime, end: datetime, granularity: str) -> list:
+    points = {}
+    cursor = bucket_start(start, granularity)
+    while cursor < end:
+        points[cursor] = {f: 0 for f in METRIC_FIELDS}
+        cursor += BUCKET_SPANS[granularity]
+    query = {"scope": scope, "key": key, "user_id": user_id, "bucket": {"$gte": bucket_start(start, "day"), "$lt": end}}
+    async for doc in db.run_metrics.find(query, {"_id": 0, "bucket": 1, **{f: 1 for f in METRIC_FIELDS}}):
+        # Buckets coarser than the requested resolution (older data) land on their start
+        point = points.get(bucket_start(doc["bucket"].replace(tzinfo=timezone.utc), granularity))
+        if point is not None:
+            for f in METRIC_FIELDS:
+                point[f] += doc.get(f, 0)
+    return [{"t": t.isoformat(), **values} for t, values in points.items()]
+
+@api_router.get("/dashboard/timeseries")
+async def get_timeseries(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: Optional[str] = Query(None, pattern="^(minute|hour|day)$"),
+    automation_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    end = (end or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    start = (start or end - timedelta(days=7)).astimezone(timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    span = end - start
+    granularity = granularity or ("minute" if span <= timedelta(hours=3) else "hour" if span <= timedelta(days=3) else "day")
+    if span / BUCKET_SPANS[granularity] > 2000:
+        raise HTTPException(status_code=400, detail="Range too long for this granularity")
+    scope, key = ("automation", automation_id) if automation_id else ("user", current_user["id"])
+    points = await read_timeseries(scope, key, current_user["id"], start, end, granularity)
+    return ORJSONResponse({"granularity": granularity, "start": start.isoformat(), "end": end.isoformat(), "points": points})
+
+# ── Scheduler ───────────────────────────────────────────
+
+WEEKDAYS = {name: i for i, name in enumerate(("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"))}
+# Event triggers ("When a form is submitted on Monday") only schedule with an explicit recurrence
+EVENT_TRIGGER = re.compile(r"\b(when|whenever|if|after|upon|once|submitted|received|added|created|arrives?)\b")
+RECURRENCE = re.compile(r"\b(every|each|daily|weekly|hourly|monthly|weekdays?)\b")
+TIME_OF_DAY = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*(am|pm)\b|\b(\d{1,2}):(\d{2})\b")
+
+# A recurring schedule parsed from a trigger string such as "Every Monday 9 AM",
+# "Daily at 10 AM", "End of month" or "Every 15 minutes".
+class Schedule:
+    def __init__(self, kind: str, hour: int = 9, minute: int = 0, weekdays=None, day: str = "", every: int = 0):
+        self.kind = kind
+        self.hour = hour
+        self.minute = minute
+        self.weekdays = weekdays
+        self.day = day
+        self.every = every
+
+    def next_after(self, after: datetime, tz) -> datetime:
+        if self.kind == "interval":
+            step = self.every * 60
+            return datetime.fromtimestamp((int(after.timestamp()) // step + 1) * step, timezone.utc)
+        local = after.astimezone(tz)
+        if self.kind == "hourly":
+            return (local.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)).astimezone(timezone.utc)
+        if self.kind == "daily":
+            candidate = local.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+            while candidate <= local or (self.weekdays and candidate.weekday() not in self.weekdays):
+                candidate = (candidate + timedelta(days=1)).replace(hour=self.hour, minute=self.minute)
+            return candidate.astimezone(timezone.utc)
+        # monthly
+        year, month = local.year, local.month
+        while True:
+            day = calendar.monthrange(year, month)[1] if self.day == "last" else 1
+            candidate = local.replace(year=year, month=month, day=day, hour=self.hour, minute=self.minute, second=0, microsecond=0)
+            if candidate > local:
+                return candidate.astimezone(timezone.utc)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+def parse_time_of_day(text: str) -> tuple:
+    match = TIME_OF_DAY.search(text)
+    if not match:
+        return 9, 0
+    if match.group(1):
+        hour, minute = int(match.group(1)) % 12, int(match.group(2) or 0)
+        if match.group(3) == "pm":
+            hour += 12
+        return hour, minute
+    return int(match.group(4)), int(match.group(5))
+
+# Cached so the many automations sharing a trigger string share one Schedule object
+@functools.lru_cache(maxsize=4096)
+def parse_schedule(trigger: str) -> Optional[Schedule]:
+    text = " ".join((trigger or "").lower().split())
+    if EVENT_TRIGGER.search(text) and not RECURRENCE.search(text):
+        return None
+    hour, minute = parse_time_of_day(text)
+    interval = re.search(r"every (\d+) min", text)
+    if interval and int(interval.group(1)) > 0:
+        return Schedule("interval", every=int(interval.group(1)))
+    if "hourly" in text or "every hour" in text:
+        return Schedule("hourly")
+    if "end of month" in text or "last day of" in text:
+        return Schedule("monthly", hour, minute, day="last")
+    if "monthly" in text or "start of month" in text or "first of" in text:
+        return Schedule("monthly", hour, minute, day="first")
+    if "weekday" in text:
+        return Schedule("daily", hour, minute, weekdays={0, 1, 2, 3, 4})
+    days = {i for name, i in WEEKDAYS.items() if re.search(rf"\b{name}s?\b", text)}
+    if days and ("every" in text or "weekly" in text or "on " in text):
+        return Schedule("daily", hour, minute, weekdays=days)
+    if "daily" in text or "every day" in text or "every morning" in text:
+        return Schedule("daily", hour, minute)
+    return None
+
+# Keeps every active time-triggered automation in a min-heap of next fire times.
+# Writes on this replica update it directly; writes on other replicas are picked up
+# every SCHEDULER_SYNC_INTERVAL by re-reading automations whose updated_at moved,
+# so no replica rescans the collection. Superseded heap entries are skipped via a
+# per-automation generation and compacted when they pile up. An insert into
+# schedule_leases keyed by (automation, occurrence) ensures each occurrence fires on
+# exactly one replica, and the lease is only taken once the runner has room for it.
+class Scheduler:
+    def __init__(self, tz_name: str):
+        self.tz = ZoneInfo(tz_name)
+        self.fired = 0
+        self.lost_leases = 0
+        self.skipped = 0
+        self.max_lag_ms = 0.0
+        self._heap = []
+        self._entries = {}
+        self._generation = 0
+        self._synced_at = ""
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._sync_task: Optional[asyncio.Task] = None
+        self._claims = set()
+
+    def upsert(self, automation: dict):
+        trigger = automation.get("trigger") or ""
+        schedule = parse_schedule(trigger)
+        if schedule is None or automation.get("status") != "active":
+            self.remove(automation["id"])
+            return
+        current = self._entries.get(automation["id"])
+        if current is not None and current[2] == trigger:
+            return
+        self._generation += 1
+        fire_at = schedule.next_after(datetime.now(timezone.utc), self.tz)
+        self._entries[automation["id"]] = (self._generation, schedule, trigger)
+        heapq.heappush(self._heap, (fire_at.timestamp(), self._generation, automation["id"]))
+        if self._heap[0][1] == self._generation:
+            self._wake.set()
+        self._compact()
+
+    def remove(self, automation_id: str):
+        if self._entries.pop(automation_id, None) is not None:
+            self._compact()
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self._entries) + 1024:
+            self._heap = [e for e in self._heap if self._entries.get(e[2], (None,))[0] == e[1]]
+            heapq.heapify(self._heap)
+
+    async def load(self):
+        self._heap.clear()
+        self._entries.clear()
+        self._synced_at = datetime.now(timezone.utc).isoformat()
+        cursor = db.automations.find({"status": "active"}, {"_id": 0, "id": 1, "trigger": 1, "status": 1})
+        async for automation in cursor:
+            self.upsert(automation)
+        logger.info(f"Scheduler loaded {len(self._entries)} time-triggered automations")
+
+    async def sync(self):
+        # Overlap by one interval so a replica whose clock runs behind is not missed;
+        # upsert() ignores automations whose trigger and status are unchanged.
+        since = datetime.fromisoformat(self._synced_at) - timedelta(seconds=SCHEDULER_SYNC_INTERVAL)
+        self._synced_at = datetime.now(timezone.utc).isoformat()
+        cursor = db.automations.find({"updated_at": {"$gte": since.isoformat()}}, {"_id": 0, "id": 1, "trigger": 1, "status": 1})
+        async for automation in cursor:
+            self.upsert(automation)
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            self._sync_task = asyncio.create_task(self._run_sync())
+
+    async def stop(self):
+        tasks = [t for t in (self._task, self._sync_task, *self._claims) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = self._sync_task = None
+
+    async def _run_sync(self):
+        while True:
+            await asyncio.sleep(SCHEDULER_SYNC_INTERVAL)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Scheduler sync failed: {e}")
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                fire_ts, generation, automation_id = heapq.heappop(self._heap)
+                entry = self._entries.get(automation_id)
+                if entry is None or entry[0] != generation:
+                    continue
+                schedule = entry[1]
+                next_at = schedule.next_after(datetime.fromtimestamp(max(fire_ts, now), timezone.utc), self.tz)
+                heapq.heappush(self._heap, (next_at.timestamp(), generation, automation_id))
+                self.max_lag_ms = max(self.max_lag_ms, (now - fire_ts) * 1000)
+                claim = asyncio.create_task(self._fire(automation_id, generation, fire_ts))
+                self._claims.add(claim)
+                claim.add_done_callback(self._claims.discard)
+            timeout = min(self._heap[0][0] - time.time(), 60) if self._heap else 60
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, automation_id: str, generation: int, fire_ts: float):
+        occurrence = datetime.fromtimestamp(fire_ts, timezone.utc)
+        lease_id = f"{automation_id}@{occurrence.isoformat()}"
+        deadline = time.time() + SCHEDULER_FIRE_GRACE
+        while True:
+            # With the runner full the lease is left unclaimed, so a replica with room can take it
+            if automation_runner.free():
+                try:
+                    await db.schedule_leases.insert_one({"_id": lease_id, "claimed_at": datetime.now(timezone.utc)})
+                except DuplicateKeyError:
+                    self.lost_leases += 1
+                    return
+                try:
+                    automation = await db.automations.find_one({"id": automation_id, "status": "active"}, {"_id": 0})
+                    if automation is None:
+                        # Deleted or paused on another replica since the last sync
+                        if self._entries.get(automation_id, (None,))[0] == generation:
+                            self.remove(automation_id)
+                        return
+                    if automation_runner.submit(automation, {"scheduled_for": occurrence.isoformat()}, source="schedule"):
+                        self.fired += 1
+                        return
+                    # The runner filled up while the lease was being taken; hand the occurrence back
+                    await db.schedule_leases.delete_one({"_id": lease_id})
+                except Exception as e:
+                    logger.error(f"Scheduled run of {automation_id} failed: {e}")
+                    return
+            if time.time() >= deadline:
+                self.skipped += 1
+                logger.warning(f"Skipped {lease_id}: run queue full for {SCHEDULER_FIRE_GRACE:g}s")
+                return
+            await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": len(self._entries),
+            "heap_size": len(self._heap),
+            "fired": self.fired,
+            "lost_leases": self.lost_leases,
+            "skipped": self.skipped,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+        }
+
+scheduler = Scheduler(SCHEDULER_TIMEZONE)
+
+# ── Webhooks ────────────────────────────────────────────
+
+# Hook tokens are an HMAC of the automation id, so ingestion authenticates without a
+# database read. Accepted events go into a bounded in-memory buffer that is flushed
+# to the hook_events queue collection in insert_many batches; HookDispatcher claims
+# pending events from that collection in batches and hands them to the runner.
+
+hook_writer = BatchWriter("hook_events", HOOK_BUFFER_SIZE, HOOK_BATCH_SIZE, HOOK_FLUSH_INTERVAL)
+
+def hook_token(automation_id: str) -> str:
+    return hmac.new(JWT_SECRET.encode("utf-8"), f"hook:{automation_id}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+class HookDispatcher:
+    def __init__(self, batch_size: int, poll_interval: float):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.dispatched = 0
+        self.dropped = 0
+        self.requeued = 0
+        self.backlog = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.dispatch_batch()
+            except Exception as e:
+                logger.error(f"Hook dispatch failed: {e}")
+                claimed = 0
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def dispatch_batch(self) -> int:
+        # Events claimed by a worker that died before dispatching become claimable again
+        stale = datetime.now(timezone.utc) - timedelta(seconds=HOOK_CLAIM_TIMEOUT)
+        claimable = {"$or": [{"status": "pending"}, {"status": "processing", "claimed_at": {"$lt": stale}}]}
+        self.backlog = await db.hook_events.count_documents({"status": "pending"})
+        # Never claim more than the runner can take; the rest stays pending for later rounds
+        limit = min(self.batch_size, automation_runner.free())
+        if limit == 0:
+            return 0
+        pending = await db.hook_events.find(claimable, {"_id": 1}) \
+            .sort("received_at", 1).limit(limit).to_list(limit)
+        if not pending:
+            return 0
+        ids = [e["_id"] for e in pending]
+        await db.hook_events.update_many(
+            {"_id": {"$in": ids}, **claimable},
+            {"$set": {"status": "processing", "claimed_by": WORKER_ID, "claimed_at": datetime.now(timezone.utc)}},
+        )
+        events = await db.hook_events.find({"_id": {"$in": ids}, "status": "processing", "claimed_by": WORKER_ID}).to_list(None)
+        automation_ids = list({e["automation_id"] for e in events})
+        automations = {
+            a["id"]: a async for a in db.automations.find({"id": {"$in": automation_ids}, "status": "active"}, {"_id": 0})
+        }
+        done, dropped, rejected = [], [], []
+        for event in events:
+            automation = automations.get(event["automation_id"])
+            if automation is None:
+                dropped.append(event["_id"])
+            elif automation_runner.submit(automation, event["payload"], source="webhook") is None:
+                # Runner filled up (manual and scheduled runs share it): retry next round
+                rejected.append(event["_id"])
+            else:
+                done.append(event["_id"])
+        # finished_at starts the HOOK_RETENTION TTL; pending events never expire
+        finished_at = datetime.now(timezone.utc)
+        if done:
+            await db.hook_events.update_many({"_id": {"$in": done}}, {"$set": {"status": "dispatched", "finished_at": finished_at}})
+        if dropped:
+            await db.hook_events.update_many({"_id": {"$in": dropped}}, {"$set": {"status": "dropped", "finished_at": finished_at}})
+        if rejected:
+            await db.hook_events.update_many(
+                {"_id": {"$in": rejected}},
+                {"$set": {"status": "pending"}, "$unset": {"claimed_by": "", "claimed_at": ""}},
+            )
+        self.dispatched += len(done)
+        self.dropped += len(dropped)
+        self.requeued += len(rejected)
+        return len(done) + len(dropped)
+
+    def stats(self) -> dict:
+        return {"dispatched": self.dispatched, "dropped": self.dropped, "requeued": self.requeued, "backlog": self.backlog}
+
+hook_dispatcher = HookDispatcher(HOOK_DISPATCH_BATCH, HOOK_POLL_INTERVAL)
+hooks_rejected = 0
+
+def hook_stats() -> dict:
+    return {
+        **hook_writer.stats(),
+        "capacity": hook_writer.capacity,
+        "rejected": hooks_rejected,
+        **hook_dispatcher.stats(),
+    }
+
+@api_router.get("/automations/{auto_id}/hook")
+async def get_automation_hook(auto_id: str, current_user: dict = Depends(get_current_user)):
+    auto = await db.automations.find_one({"id": auto_id, "user_id": current_user["id"]}, {"_id": 1})
+    if not auto:
+        raise HTTPException(status_code=404, detail="Automation not found")
+    return {"url": f"/api/hooks/{auto_id}", "token": hook_token(auto_id)}
+
+@api_router.post("/hooks/{automation_id}", status_code=202)
+async def ingest_hook(automation_id: str, request: Request, token: Optional[str] = None, x_hook_token: Optional[str] = Header(None)):
+    global hooks_rejected
+    if not hmac.compare_digest(x_hook_token or token or "", hook_token(automation_id)):
+        raise HTTPException(status_code=401, detail="Invalid hook token")
+    body = await request.body()
+    if len(body) > HOOK_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Payload too large")
+    try:
+        payload = json.loads(body) if body else {}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Payload must be JSON")
+    event = {
+        "_id": str(uuid.uuid4()),
+        "automation_id": automation_id,
+        "payload": payload,
+        "status": "pending",
+        "received_at": datetime.now(timezone.utc),
+    }
+    if not hook_writer.offer(event):
+        hooks_rejected += 1
+        raise HTTPException(status_code=429, detail="Hook buffer full", headers={"Retry-After": "1"})
+    return {"accepted": True, "id": event["_id"]}
+
+# ── AI Suggest ──────────────────────────────────────────
+
+AI_SYSTEM_MESSAGE = """You are Flow-Forge AI, an automation assistant. When the user describes a task they want automated, respond with a JSON object containing:
 {
   "name": "Short automation name",
   "description": "Brief description of what it does",
@@ -290,54 +2427,928 @@ async def ai_suggest(data: AIRequest, current_user: dict = Depends(get_current_u
   "suggestion": "A friendly one-sentence explanation of how this helps"
 }
 Only respond with valid JSON. No markdown, no extra text."""
+
+def normalize_prompt(message: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", message.lower()).split())
+
+def parse_suggestion(response: str) -> dict:
+    clean = response.strip()
+    if clean.startswith("```"):
+        clean = clean.split("\n", 1)[1] if "\n" in clean else clean[3:]
+        clean = clean.rsplit("```", 1)[0]
+    return json.loads(clean)
+
+template_answers = 0
+
+def template_suggestion(message: str) -> Optional[dict]:
+    # Paraphrases of a catalog entry are answered locally, without an LLM round trip.
+    # Prompts that merely share vocabulary with a template ("post to slack every day"
+    # against the weekly Slack report) score high too, but rarely far ahead of the
+    # next template, so both the score and the lead over the runner-up must clear a bar.
+    global template_answers
+    matches = template_catalog.matcher.search(message, 2)
+    if not matches:
+        return None
+    template, score = matches[0]
+    runner_up = matches[1][1] if len(matches) > 1 else 0.0
+    if score < TEMPLATE_MATCH_THRESHOLD or score - runner_up < TEMPLATE_MATCH_MARGIN:
+        return None
+    template_answers += 1
+    return {
+        "suggestion": {
+            "name": template["name"],
+            "description": template["description"],
+            "trigger": template["trigger"],
+            "action": template["action"],
+            "category": template["category"],
+            "template_id": template["id"],
+            "suggestion": f"This matches our \"{template['name']}\" template, so I set it up from there.",
+        },
+        "raw": "",
+        "match": {"template_id": template["id"], "score": round(score, 4)},
+    }
+
+def fallback_suggestion(message: str, error: Exception) -> dict:
+    return {
+        "suggestion": {
+            "name": f"Automation from: {message[:50]}",
+            "description": message,
+            "trigger": "Custom trigger",
+            "action": "Custom action",
+            "category": "custom",
+            "suggestion": "I created a basic automation from your description. You can customize the trigger and action."
+        },
+        "raw": str(error)
+    }
+
+async def generate_suggestion(message: str) -> dict:
+    response = "".join([chunk async for chunk in stream_completion(message)])
+    return {"suggestion": parse_suggestion(response), "raw": response}
+
+def stream_completion(message: str):
+    return llm_gateway.stream(message)
+
+# ── LLM gateway ─────────────────────────────────────────
+
+class LLMUnavailable(Exception):
+    pass
+
+class EmergentProvider:
+    name = "emergent"
+
+    def __init__(self):
+        self._client = None
+
+    def warm_up(self):
+        if self._client is None:
+            from emergentintegrations.llm.chat import LlmChat, UserMessage
+            self._client = (LlmChat, UserMessage)
+
+    async def stream(self, message: str):
+        # LlmChat only returns whole completions, so this yields a single chunk
+        self.warm_up()
+        LlmChat, UserMessage = self._client
+        chat = LlmChat(
+            api_key=EMERGENT_LLM_KEY,
+            session_id=f"flowforge-{uuid.uuid4()}",
+            system_message=AI_SYSTEM_MESSAGE,
         ).with_model("gemini", "gemini-3-flash-preview")
-        
-        user_msg = UserMessage(text=data.message)
-        response = await chat.send_message(user_msg)
-        
-        import json
-        # Try to parse JSON from response
-        clean = response.strip()
-        if clean.startswith("```"):
-            clean = clean.split("\n", 1)[1] if "\n" in clean else clean[3:]
-            clean = clean.rsplit("```", 1)[0]
-        
-        parsed = json.loads(clean)
-        await log_activity(current_user["id"], "ai_suggestion", f"AI suggested: {parsed.get('name', 'Unknown')}")
-        return {"suggestion": parsed, "raw": response}
+        yield await chat.send_message(UserMessage(text=message))
+
+# Offline stand-in with tunable latency and failure rate, for tests and benchmarks
+class FakeProvider:
+    name = "fake"
+
+    def __init__(self, latency: float = LLM_FAKE_LATENCY, failure_rate: float = LLM_FAKE_FAILURE_RATE, chunks: int = 4):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.chunks = chunks
+
+    def warm_up(self):
+        pass
+
+    async def stream(self, message: str):
+        if random.random() < self.failure_rate:
+            await asyncio.sleep(self.latency)
+            raise RuntimeError("Fake provider failure")
+        text = json.dumps({
+            "name": message[:50].strip().capitalize() or "New automation",
+            "description": message,
+            "trigger": "Custom trigger",
+            "action": "Custom action",
+            "category": "custom",
+            "suggestion": "This automation handles the task you described.",
+        })
+        step = -(-len(text) // self.chunks)
+        for i in range(0, len(text), step):
+            await asyncio.sleep(self.latency / self.chunks)
+            yield text[i:i + step]
+
+LLM_PROVIDERS = {"emergent": EmergentProvider, "fake": FakeProvider}
+
+# closed -> open after N consecutive failures; after the cooldown one trial call is
+# let through (half-open) and its outcome closes or re-opens the breaker.
+class CircuitBreaker:
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+            return True
+        return self.state == "closed"
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+# Single entry point for model calls: caps concurrency, enforces one deadline over
+# queueing plus generation, and fails fast while the breaker is open.
+class LLMGateway:
+    def __init__(self, provider, max_concurrency: int, timeout: float, breaker: CircuitBreaker):
+        self.provider = provider
+        self.timeout = timeout
+        self.breaker = breaker
+        self.in_flight = 0
+        self.timeouts = 0
+        self.short_circuited = 0
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def start(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def warm_up(self):
+        try:
+            self.provider.warm_up()
+            logger.info(f"LLM provider ready: {self.provider.name}")
+        except Exception as e:
+            logger.error(f"LLM provider warm-up failed: {e}")
+
+    async def stream(self, message: str):
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            raise LLMUnavailable("LLM provider unavailable (circuit open)")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMUnavailable("LLM gateway saturated")
+        self.in_flight += 1
+        started = time.perf_counter()
+        outcome = "error"
+        chunks = self.provider.stream(message)
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                yield chunk
+            self.breaker.record_success()
+            outcome = "ok"
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            self.timeouts += 1
+            self.breaker.record_failure()
+            raise LLMUnavailable(f"LLM call exceeded {self.timeout}s deadline")
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            LLM_LATENCY.observe((self.provider.name, outcome), time.perf_counter() - started)
+            await chunks.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.provider.name,
+            "in_flight": self.in_flight,
+            "timeouts": self.timeouts,
+            "short_circuited": self.short_circuited,
+            "breaker": self.breaker.state,
+        }
+
+llm_gateway = LLMGateway(
+    LLM_PROVIDERS[LLM_PROVIDER](),
+    LLM_MAX_CONCURRENCY,
+    LLM_TIMEOUT,
+    CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN),
+)
+
+# Concurrent calls for the same key share one in-flight task. Waiters are shielded
+# so a client disconnect does not cancel the call other requests are waiting on.
+class SingleFlight:
+    def __init__(self):
+        self.coalesced = 0
+        self._inflight = {}
+
+    async def do(self, key: str, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+# Successful suggestions keyed by normalized prompt; fallbacks are never cached
+suggestion_cache = TTLCache(AI_CACHE_SIZE, AI_CACHE_TTL)
+suggestion_flights = SingleFlight()
+
+async def suggest(message: str) -> dict:
+    matched = template_suggestion(message)
+    if matched is not None:
+        return matched
+    key = normalize_prompt(message)
+    result = suggestion_cache.get(key)
+    if result is None:
+        result = await suggestion_flights.do(key, lambda: generate_suggestion(message))
+        suggestion_cache.set(key, result)
+    return result
+
+def suggestion_stats() -> dict:
+    return {**suggestion_cache.stats(), "coalesced": suggestion_flights.coalesced, "template_answers": template_answers}
+
+@api_router.post("/ai/suggest", dependencies=[Depends(limit_by_user("ai"))])
+async def ai_suggest(data: AIRequest, current_user: dict = Depends(get_current_user)):
+    try:
+        result = await suggest(data.message)
+        await log_activity(current_user["id"], "ai_suggestion", f"AI suggested: {result['suggestion'].get('name', 'Unknown')}")
+        return result
     except Exception as e:
         logger.error(f"AI suggestion error: {e}")
-        # Fallback suggestion
+        return fallback_suggestion(data.message, e)
+
+# ── AI Suggest (streaming) ──────────────────────────────
+
+SUGGESTION_FIELDS = ("name", "description", "trigger", "action", "category", "suggestion")
+COMPLETED_FIELD = re.compile(r'"(' + "|".join(SUGGESTION_FIELDS) + r')"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+# Emits each top-level string field as soon as its closing quote has arrived,
+# without waiting for the rest of the JSON object.
+class IncrementalSuggestionParser:
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+
+    def feed(self, chunk: str) -> list:
+        self.buffer += chunk
+        completed = []
+        for match in COMPLETED_FIELD.finditer(self.buffer):
+            field = match.group(1)
+            if field not in self.fields:
+                self.fields[field] = json.loads('"' + match.group(2) + '"')
+                completed.append((field, self.fields[field]))
+        return completed
+
+def sse_event(event: str, data, event_id: Optional[str] = None) -> str:
+    prefix = f"id: {event_id}\n" if event_id else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+async def suggestion_events(message: str, user_id: str):
+    # Flush headers and a first byte immediately so clients can render progress
+    yield sse_event("start", {})
+    key = normalize_prompt(message)
+    try:
+        result = template_suggestion(message) or suggestion_cache.get(key)
+        if result is None:
+            parser = IncrementalSuggestionParser()
+            chunks = []
+            async for chunk in stream_completion(message):
+                chunks.append(chunk)
+                yield sse_event("token", {"text": chunk})
+                for field, value in parser.feed(chunk):
+                    yield sse_event("field", {"field": field, "value": value})
+            raw = "".join(chunks)
+            result = {"suggestion": parse_suggestion(raw), "raw": raw}
+            suggestion_cache.set(key, result)
+        else:
+            for field in SUGGESTION_FIELDS:
+                if field in result["suggestion"]:
+                    yield sse_event("field", {"field": field, "value": result["suggestion"][field]})
+        await log_activity(user_id, "ai_suggestion", f"AI suggested: {result['suggestion'].get('name', 'Unknown')}")
+    except Exception as e:
+        logger.error(f"AI suggestion stream error: {e}")
+        result = fallback_suggestion(message, e)
+    yield sse_event("done", result)
+
+@api_router.post("/ai/suggest/stream", dependencies=[Depends(limit_by_user("ai"))])
+async def ai_suggest_stream(data: AIRequest, current_user: dict = Depends(get_current_user)):
+    return StreamingResponse(
+        suggestion_events(data.message, current_user["id"]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ── Live dashboard ──────────────────────────────────────
+
+# One LiveFeed per worker follows automations, activity_log and user_stats through a
+# single change stream and fans small deltas out to the open /api/live connections
+# of the affected user. Where change streams are unavailable (standalone mongod,
+# local stand-ins) it polls instead: one query per collection per interval, covering
+# every connected user at once.
+#
+# Events: automation (full document), automation_deleted ({id}), stats (the
+# /dashboard/stats shape), activity (one log entry), and resync when the client
+# should refetch everything (also sent first to a client with nothing to resume
+# from). Every delta carries an SSE id. A reconnecting client sends the last one
+# back (Last-Event-ID or ?last_event_id=), and whatever that user missed is
+# replayed from a bounded per-worker buffer. In change-stream mode the ids are
+# resume tokens, so any worker can serve the reconnect.
+LIVE_COLLECTIONS = ("automations", "activity_log", "user_stats")
+CHANGE_STREAM_HISTORY_LOST = 286
+
+def public_doc(doc: dict, projection: Optional[dict] = None) -> dict:
+    # Change events carry the full document; drop what the matching REST read projects out
+    hidden = projection or {"_id": 0}
+    return {k: v for k, v in doc.items() if hidden.get(k, 1)}
+
+class LiveSubscription:
+    # Pending deltas are keyed (automation id, stats, activity id), so a burst of
+    # writes to one automation reaches the client as a single event.
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.pending: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.resync = False
+        self.closed = False
+        self.wake = asyncio.Event()
+
+    def push(self, key: tuple, event_id: str, event: str, data):
+        self.pending.pop(key, None)
+        self.pending[key] = (event_id, event, data)
+        if len(self.pending) > LIVE_MAX_PENDING:
+            # Too far behind to be worth catching up delta by delta
+            self.pending.clear()
+            self.resync = True
+        self.wake.set()
+
+    def request_resync(self):
+        self.pending.clear()
+        self.resync = True
+        self.wake.set()
+
+    def drain(self) -> list:
+        events = list(self.pending.values())
+        self.pending.clear()
+        self.wake.clear()
+        return events
+
+class LiveFeed:
+    def __init__(self, poll_interval: float, replay: int):
+        self.poll_interval = poll_interval
+        self.mode = "starting"
+        self.delivered = 0
+        self.resyncs = 0
+        self._subscribers: dict = {}
+        self._replay: deque = deque(maxlen=replay)
+        self._owners: "OrderedDict[object, dict]" = OrderedDict()
+        self._token = None
+        self._opened = False
+        self._seq = 0
+        self._snapshots: dict = {}
+        self._activity_seen: "OrderedDict[str, str]" = OrderedDict()
+        self._polling_since = ""
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for subs in self._subscribers.values():
+            for sub in subs:
+                sub.closed = True
+                sub.wake.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def subscribe(self, user_id: str, last_event_id: Optional[str] = None) -> LiveSubscription:
+        sub = LiveSubscription(user_id)
+        if self.mode == "polling" and user_id not in self._snapshots:
+            # Baseline before the client fetches, so nothing written after that is missed
+            await self._poll_stats([user_id])
+            await self._poll_automations([user_id])
+        if last_event_id:
+            self._replay_into(sub, last_event_id)
+        self._subscribers.setdefault(user_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: LiveSubscription):
+        subs = self._subscribers.get(sub.user_id)
+        if subs is None:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subscribers[sub.user_id]
+            self._snapshots.pop(sub.user_id, None)
+
+    def position(self) -> Optional[str]:
+        return self._replay[-1][0] if self._replay else None
+
+    def _replay_into(self, sub: LiveSubscription, last_event_id: str):
+        entries = list(self._replay)
+        for i, entry in enumerate(entries):
+            if entry[0] == last_event_id:
+                for event_id, user_id, key, event, data in entries[i + 1:]:
+                    if user_id == sub.user_id:
+                        sub.push(key, event_id, event, data)
+                return
+        # Older than the buffer, or an id from another worker's polling feed
+        self.resyncs += 1
+        sub.request_resync()
+
+    def publish(self, user_id: str, key: tuple, event: str, data, event_id: Optional[str] = None):
+        if event_id is None:
+            self._seq += 1
+            event_id = f"{WORKER_ID}-{self._seq}"
+        self._replay.append((event_id, user_id, key, event, data))
+        for sub in self._subscribers.get(user_id, ()):
+            sub.push(key, event_id, event, data)
+
+    async def _run(self):
+        while True:
+            try:
+                await self._watch()
+            except ConnectionFailure as e:
+                logger.error(f"Live change stream lost its connection: {e}")
+            except Exception as e:
+                if not self._opened:
+                    logger.info(f"Change streams unavailable ({e}); live updates fall back to polling")
+                    break
+                if isinstance(e, OperationFailure) and e.code == CHANGE_STREAM_HISTORY_LOST:
+                    # The resume point fell off the oplog: every client reloads
+                    self._token = None
+                    for subs in self._subscribers.values():
+                        for sub in subs:
+                            sub.request_resync()
+                logger.error(f"Live change stream failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+        self.mode = "polling"
+        self._polling_since = datetime.now(timezone.utc).isoformat()
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Live poll failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _watch(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(LIVE_COLLECTIONS)},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        async with db.watch(pipeline, full_document="updateLookup", resume_after=self._token) as stream:
+            self._opened = True
+            self.mode = "change_stream"
+            async for change in stream:
+                self._token = stream.resume_token
+                self.handle_change(change)
+
+    def handle_change(self, change: dict):
+        event_id = change["_id"]["_data"]
+        collection = change["ns"]["coll"]
+        doc = change.get("fullDocument")
+        if change["operationType"] == "delete":
+            if collection == "automations":
+                # Deletes carry only the _id, so owners are remembered from earlier events.
+                # Deletes of documents this worker never saw stay unrouted; the user's
+                # stats event still reflects them.
+                owner = self._owners.pop(change["documentKey"]["_id"], None)
+                if owner:
+                    self.publish(owner["user_id"], ("automation", owner["id"]), "automation_deleted", {"id": owner["id"]}, event_id)
+        elif doc is None:
+            return
+        elif collection == "user_stats":
+            self.publish(doc["_id"], ("stats",), "stats", dashboard_stats(doc), event_id)
+        elif collection == "activity_log":
+            self.publish(doc["user_id"], ("activity", doc["id"]), "activity", public_doc(doc, ACTIVITY_PROJECTION), event_id)
+        else:
+            self._owners[doc["_id"]] = {"user_id": doc["user_id"], "id": doc["id"]}
+            self._owners.move_to_end(doc["_id"])
+            while len(self._owners) > self._replay.maxlen:
+                self._owners.popitem(last=False)
+            self.publish(doc["user_id"], ("automation", doc["id"]), "automation", public_doc(doc), event_id)
+
+    async def poll(self):
+        users = list(self._subscribers)
+        if users:
+            await self._poll_stats(users)
+            await self._poll_automations(users)
+            await self._poll_activity(users)
+
+    async def _poll_stats(self, users: list):
+        async for doc in db.user_stats.find({"_id": {"$in": users}}, {"rebuilt_at": 0}):
+            stats = dashboard_stats(doc)
+            snapshot = self._snapshots.setdefault(doc["_id"], {})
+            previous = snapshot.get("stats")
+            snapshot["stats"] = stats
+            if previous is not None and previous != stats:
+                self.publish(doc["_id"], ("stats",), "stats", stats)
+
+    async def _poll_automations(self, users: list):
+        # Compare small fingerprints first and only fetch documents that changed
+        fingerprints = {user_id: {} for user_id in users}
+        fields = {"_id": 0, "id": 1, "user_id": 1, "status": 1, "tasks_run": 1, "minutes_saved": 1, "version": 1}
+        async for doc in db.automations.find({"user_id": {"$in": users}}, fields):
+            fingerprints[doc["user_id"]][doc["id"]] = doc
+        changed = []
+        for user_id, current in fingerprints.items():
+            snapshot = self._snapshots.setdefault(user_id, {})
+            previous = snapshot.get("automations")
+            snapshot["automations"] = current
+            if previous is None:
+                continue
+            for automation_id in previous.keys() - current.keys():
+                self.publish(user_id, ("automation", automation_id), "automation_deleted", {"id": automation_id})
+            changed.extend(a for a, fingerprint in current.items() if previous.get(a) != fingerprint)
+        if changed:
+            async for doc in db.automations.find({"id": {"$in": changed}}, {"_id": 0}):
+                self.publish(doc["user_id"], ("automation", doc["id"]), "automation", doc)
+
+    async def _poll_activity(self, users: list):
+        # Write-behind rows land up to a few flush intervals after their timestamp,
+        # so look back that far and skip rows already delivered
+        lookback = datetime.now(timezone.utc) - timedelta(seconds=self.poll_interval + 4 * ACTIVITY_FLUSH_INTERVAL)
+        since = max(lookback.isoformat(), self._polling_since)
+        while self._activity_seen and next(iter(self._activity_seen.values())) <= since:
+            self._activity_seen.popitem(last=False)
+        cursor = db.activity_log.find({"user_id": {"$in": users}, "timestamp": {"$gt": since}}, ACTIVITY_PROJECTION).sort("timestamp", 1)
+        async for doc in cursor:
+            if doc["id"] not in self._activity_seen:
+                self._activity_seen[doc["id"]] = doc["timestamp"]
+                self.publish(doc["user_id"], ("activity", doc["id"]), "activity", doc)
+
+    def stats(self) -> dict:
         return {
-            "suggestion": {
-                "name": f"Automation from: {data.message[:50]}",
-                "description": data.message,
-                "trigger": "Custom trigger",
-                "action": "Custom action",
-                "category": "custom",
-                "suggestion": "I created a basic automation from your description. You can customize the trigger and action."
-            },
-            "raw": str(e)
+            "mode": self.mode,
+            "users": len(self._subscribers),
+            "connections": sum(len(subs) for subs in self._subscribers.values()),
+            "delivered": self.delivered,
+            "resyncs": self.resyncs,
+            "replay": len(self._replay),
         }
 
+live_feed = LiveFeed(LIVE_POLL_INTERVAL, LIVE_REPLAY)
+
+async def live_events(user_id: str, last_event_id: Optional[str]):
+    sub = await live_feed.subscribe(user_id, last_event_id)
+    if not last_event_id:
+        # A fresh client has nothing to resume from: have it load once, after the subscription exists
+        sub.request_resync()
+    # Connections are recycled so workers can drain; EventSource reconnects with Last-Event-ID
+    deadline = time.monotonic() + LIVE_MAX_AGE
+    try:
+        yield "retry: 2000\n\n"
+        yield sse_event("ready", {"mode": live_feed.mode}, last_event_id or live_feed.position())
+        while not sub.closed and time.monotonic() < deadline:
+            try:
+                await asyncio.wait_for(sub.wake.wait(), LIVE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            # Let a burst of writes settle so it goes out as one batch
+            await asyncio.sleep(LIVE_COALESCE)
+            if sub.resync:
+                sub.resync = False
+                sub.drain()
+                yield sse_event("resync", {}, live_feed.position())
+                continue
+            for event_id, event, data in sub.drain():
+                live_feed.delivered += 1
+                yield sse_event(event, data, event_id)
+    finally:
+        live_feed.unsubscribe(sub)
+
+@api_router.post("/live/token")
+async def live_token(current_user: dict = Depends(get_current_user)):
+    return {"token": create_scoped_token(current_user["id"], "live", LIVE_TOKEN_TTL), "expires_in": LIVE_TOKEN_TTL}
+
+@api_router.get("/live")
+async def live(request: Request, last_event_id: Optional[str] = None, current_user: dict = Depends(get_live_user)):
+    # The dashboard reopens its EventSource with a fresh token after an error, so it
+    # passes the resume point as ?last_event_id= rather than relying on the header
+    return StreamingResponse(
+        live_events(current_user["id"], request.headers.get("last-event-id") or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ── Admin: profiling ────────────────────────────────────
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not PROFILE_ADMIN_TOKEN or not hmac.compare_digest(x_admin_token or "", PROFILE_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@api_router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    return [{k: v for k, v in p.items() if k != "stacks"} for p in reversed(profiler.profiles)]
+
+@api_router.get("/admin/profiles/worker", dependencies=[Depends(require_admin)])
+async def get_worker_profile():
+    return Response(collapsed(profiler.window_stacks()), media_type="text/plain")
+
+@api_router.post("/admin/profiles/worker", dependencies=[Depends(require_admin)])
+async def start_worker_profile(seconds: float = Query(30, gt=0, le=600)):
+    profiler.start_window(seconds, asyncio.get_running_loop())
+    return {"status": "sampling", "seconds": seconds}
+
+@api_router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    profile = next((p for p in profiler.profiles if p["id"] == profile_id), None)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(collapsed(profile["stacks"]), media_type="text/plain")
+
 # ── Health ──────────────────────────────────────────────
 
+def component_stats() -> dict:
+    return {
+        "user_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "activity_writer": activity_writer.stats(),
+        "ai_suggest": suggestion_stats(),
+        "llm": llm_gateway.stats(),
+        "runner": automation_runner.stats(),
+        "scheduler": scheduler.stats(),
+        "hooks": hook_stats(),
+        "live": live_feed.stats(),
+        "activity_archive": dict(archive_stats),
+        "rate_limits": rate_buckets.stats(),
+        "startup": dict(startup_timings),
+    }
+
 @api_router.get("/health")
 async def health():
-    return {"status": "ok", "service": "flow-forge"}
+    return {"status": "ok", "service": "flow-forge", **component_stats()}
 
-# ── Include router + middleware ─────────────────────────
+def render_metrics() -> str:
+    for component, stats in component_stats().items():
+        for stat, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                COMPONENT_STATS.set((component, stat), value)
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
 
-app.include_router(api_router)
+async def metrics():
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# ── Indexes ─────────────────────────────────────────────
+
+# Every index a handler depends on, as (collection, keys, options).
+# user_stats needs none: it is keyed by _id.
+INDEXES = [
+    ("users", [("email", 1)], {"unique": True}),
+    ("users", [("id", 1)], {"unique": True}),
+    ("automations", [("id", 1)], {"unique": True}),
+    ("automations", [("user_id", 1), ("created_at", -1), ("id", -1)], {}),
+    ("activity_log", [("user_id", 1), ("timestamp", -1), ("id", -1)], {}),
+    ("activity_log", [("logged_at", 1)], {"expireAfterSeconds": ACTIVITY_TTL_SECONDS}),
+    ("activity_archive", [("user_id", 1), ("newest", -1)], {}),
+    ("activity_archive", [("user_id", 1), ("oldest", 1)], {}),
+    ("rate_limits", [("updated", 1)], {"expireAfterSeconds": 86400}),
+    ("automation_runs", [("automation_id", 1), ("started_at", -1)], {}),
+    ("automations", [("status", 1)], {}),
+    ("automations", [("updated_at", 1)], {}),
+    ("schedule_leases", [("claimed_at", 1)], {"expireAfterSeconds": SCHEDULER_LEASE_TTL}),
+    ("hook_events", [("status", 1), ("received_at", 1)], {}),
+    ("hook_events", [("finished_at", 1)], {"expireAfterSeconds": HOOK_RETENTION}),
+    ("automation_runs", [("recorded_at", 1)], {"expireAfterSeconds": int(RUN_RETENTION_DAYS * 86400)}),
+    ("run_metrics", [("scope", 1), ("key", 1), ("bucket", 1)], {}),
+    ("run_metrics", [("granularity", 1), ("bucket", 1)], {}),
+]
+
+# Representative query shape for each handler, as (name, collection, filter, sort).
+# Checked with explain() by verify_query_plans().
+QUERY_SHAPES = [
+    ("register/login", "users", {"email": "probe@example.com"}, None),
+    ("get_current_user", "users", {"id": "probe"}, None),
+    ("toggle/delete_automation", "automations", {"id": "probe", "user_id": "probe"}, None),
+    ("get_automations", "automations", page_query("probe", "created_at", encode_cursor("probe", "probe")), [("created_at", -1), ("id", -1)]),
+    ("get_dashboard_stats (rebuild)", "automations", {"user_id": "probe"}, None),
+    ("scheduler sync", "automations", {"updated_at": {"$gte": "probe"}}, None),
+    ("get_activity", "activity_log", page_query("probe", "timestamp", encode_cursor("probe", "probe")), [("timestamp", -1), ("id", -1)]),
+    ("export (activity)", "activity_log", {"user_id": "probe", "$and": [{"timestamp": {"$gte": "probe"}}]}, [("timestamp", 1), ("id", 1)]),
+    ("get_activity (archive)", "activity_archive", {"user_id": "probe", "oldest": {"$lte": "probe"}}, [("newest", -1)]),
+    ("export (activity archive)", "activity_archive", {"user_id": "probe", "newest": {"$gte": "probe"}}, [("oldest", 1)]),
+    ("archive_activity", "activity_log", {"logged_at": {"$lt": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, [("logged_at", 1)]),
+]
+
+async def ensure_index(collection: str, keys: list, options: dict):
+    try:
+        await db[collection].create_index(keys, **options)
+    except OperationFailure as e:
+        if e.code == 85 and "expireAfterSeconds" in options:
+            # TTL changed through config: update the existing index in place
+            await db.command("collMod", collection, index={"keyPattern": dict(keys), "expireAfterSeconds": options["expireAfterSeconds"]})
+            return
+        # e.g. existing duplicate emails block the unique index; keep serving but make it visible
+        logger.error(f"Could not create index {collection} {keys}: {e}")
+
+async def ensure_indexes():
+    await asyncio.gather(*(ensure_index(*index) for index in INDEXES))
+
+def plan_stages(plan) -> set:
+    stages = set()
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.add(plan["stage"])
+        for value in plan.values():
+            stages |= plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            stages |= plan_stages(value)
+    return stages
+
+async def verify_query_plans():
+    scans = []
+    for name, collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = await cursor.explain()
+        stages = plan_stages(plan.get("queryPlanner", {}).get("winningPlan", {}))
+        if "COLLSCAN" in stages:
+            scans.append(f"{name} ({collection} {query})")
+        else:
+            logger.info(f"Query plan ok: {name} -> {sorted(stages)}")
+    if scans:
+        raise RuntimeError("Queries without a supporting index: " + "; ".join(scans))
+
+# ── App factory ─────────────────────────────────────────
+#
+# `uvicorn server:app` serves the module-level app below; `uvicorn server:create_app --factory`
+# builds a fresh one per process. To use several cores, run one worker process per core.
+# Each worker opens its own pool of up to MONGO_MAX_POOL connections, so keep
+# workers × MONGO_MAX_POOL under the MongoDB connection limit:
+#
+#     uvicorn server:app --host 0.0.0.0 --port 8001 --workers 4 --timeout-graceful-shutdown 30
+#     gunicorn server:app -k uvicorn.workers.UvicornWorker -w 4 --graceful-timeout 30
+#
+# On SIGTERM a worker stops accepting connections and lets in-flight requests finish,
+# up to the graceful timeout. /api/live streams are cut at that point, and their clients
+# reconnect elsewhere with Last-Event-ID. Then the lifespan shutdown runs. It stops the
+# scheduler, the webhook dispatcher and the metrics compactor, flushes buffered activity and hook
+# writes, and finally closes the Mongo client.
+#
+# A worker only accepts traffic once the lifespan startup has finished. That startup
+# opens MONGO_WARM_CONNECTIONS connections, builds indexes, loads templates and
+# warms up the LLM provider. Time to each phase is reported under "startup" in /api/health.
+
+background_tasks = []
+startup_timings = {}
+
+def mark_startup(phase: str):
+    startup_timings[phase + "_s"] = round(time.perf_counter() - BOOT_STARTED, 4)
+
+async def warm_mongo_pool():
+    await db.command("ping")
+    # Concurrent pings each check out a connection of their own
+    await asyncio.gather(*(db.command("ping") for _ in range(MONGO_WARM_CONNECTIONS - 1)))
+
+async def prepare_indexes():
+    await ensure_indexes()
+    if VERIFY_QUERY_PLANS:
+        await verify_query_plans()
+
+async def load_templates():
+    if TEMPLATES_COLLECTION:
+        await template_catalog.load_collection(TEMPLATES_COLLECTION)
+
+async def start_background_workers():
+    # Components are module singletons but each lifespan gets its own event loop,
+    # so every start() builds its semaphores, queues and events afresh.
+    password_hasher.start()
+    automation_runner.start()
+    llm_gateway.start()
+    if ACTIVITY_WRITE_BEHIND:
+        activity_writer.start()
+    if SCHEDULER_ENABLED:
+        await scheduler.load()
+        scheduler.start()
+    hook_writer.start()
+    hook_dispatcher.start()
+    live_feed.start()
+    background_tasks.append(asyncio.create_task(run_metrics_compactor()))
+    if ACTIVITY_ARCHIVE:
+        background_tasks.append(asyncio.create_task(run_activity_archiver()))
+
+async def stop_background_workers():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await live_feed.stop()
+    await scheduler.stop()
+    await hook_dispatcher.stop()
+    await hook_writer.stop()
+    await activity_writer.stop()
+
+def lifespan(database=None):
+    @contextlib.asynccontextmanager
+    async def run(app: FastAPI):
+        global client, db
+        if database is None:
+            client = connect_mongo()
+            db = client[DB_NAME]
+        else:
+            db = database
+        try:
+            await warm_mongo_pool()
+            mark_startup("mongo")
+            await asyncio.gather(prepare_indexes(), load_templates(), llm_gateway.warm_up())
+            mark_startup("warm")
+            await start_background_workers()
+            mark_startup("ready")
+            logger.info(f"Worker {os.getpid()} ready in {startup_timings['ready_s']}s")
+            yield
+        finally:
+            await stop_background_workers()
+            user_cache.clear()
+            suggestion_cache.clear()
+            password_hasher.shutdown()
+            if database is None:
+                client.close()
+    return run
+
+def create_app(database=None) -> FastAPI:
+    """Build the ASGI app. Pass `database` to serve from an already-open database
+    (tests, benchmarks); otherwise the lifespan connects to MONGO_URL.
+
+    The lifespan binds the module-level `client`/`db` and starts the module's worker
+    singletons, so only one app may be running per process at a time; apps can be
+    started one after another (each lifespan rebuilds its loop-bound state)."""
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan(database))
+    app.include_router(api_router)
+    app.add_api_route("/metrics", metrics, include_in_schema=False)
+
+    app.add_middleware(ProfilingMiddleware)
+    app.add_middleware(MetricsMiddleware)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
+    )
+    return app
+
+app = create_app()
+
+# ── Maintenance CLI ─────────────────────────────────────
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Flow-Forge maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("rebuild-stats", help="Recompute user_stats from the automations collection")
+    rebuild.add_argument("--user", help="Only rebuild this user id")
+    commands.add_parser("verify-indexes", help="Ensure indexes, then fail on any COLLSCAN query plan")
+    commands.add_parser("backfill-activity-dates", help="Set logged_at on activity rows that predate it")
+    args = parser.parse_args()
+
+    async def main():
+        global client, db
+        client = connect_mongo()
+        db = client[DB_NAME]
+        if args.command == "rebuild-stats":
+            if args.user:
+                print(await rebuild_user_stats(args.user))
+            else:
+                print(f"Rebuilt stats for {await rebuild_all_user_stats()} users")
+        elif args.command == "verify-indexes":
+            await ensure_indexes()
+            await verify_query_plans()
+            print("All query shapes are index-backed")
+        elif args.command == "backfill-activity-dates":
+            print(f"Backfilled logged_at on {await backfill_activity_dates()} activity rows")
+        client.close()
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+    asyncio.run(main())
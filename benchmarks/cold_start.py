@@ -0,0 +1,90 @@
+"""Cold-start-to-healthy benchmark for the Flow-Forge API.
+
+Launches `uvicorn server:app` as a subprocess, polls /api/health until it answers,
+and stops the server with SIGTERM, timing each step. The server's own startup
+phase timings from /api/health are printed too. MONGO_URL and DB_NAME come from
+the environment or backend/.env, exactly as for a real deployment.
+
+    python benchmarks/cold_start.py --runs 5 --workers 1 --max-seconds 3
+"""
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def cold_start(workers: int, timeout: float) -> dict:
+    port = free_port()
+    command = [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port),
+               "--workers", str(workers), "--timeout-graceful-shutdown", "30", "--log-level", "warning"]
+    started = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=BACKEND_DIR)
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with {proc.returncode} before becoming healthy")
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f"server not healthy after {timeout}s")
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1)
+                if response.status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        healthy = time.perf_counter() - started
+        stopping = time.perf_counter()
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+        return {
+            "healthy_s": round(healthy, 3),
+            "shutdown_s": round(time.perf_counter() - stopping, 3),
+            "phases": response.json().get("startup", {}),
+        }
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--timeout", type=float, default=60, help="give up on a run after this many seconds")
+    parser.add_argument("--max-seconds", type=float, help="exit non-zero if the median cold start exceeds this")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    results = []
+    for i in range(args.runs):
+        result = cold_start(args.workers, args.timeout)
+        results.append(result)
+        phases = " ".join(f"{k}={v}" for k, v in result["phases"].items())
+        print(f"run {i + 1}: healthy in {result['healthy_s']}s, shutdown {result['shutdown_s']}s ({phases})")
+
+    healthy = [r["healthy_s"] for r in results]
+    median = statistics.median(healthy)
+    print(f"cold start to healthy: min {min(healthy)}s median {median}s max {max(healthy)}s")
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"Median cold start {median}s exceeds {args.max_seconds}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
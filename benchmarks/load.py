@@ -0,0 +1,233 @@
+"""Concurrent load and latency benchmark for the Flow-Forge API.
+
+By default the FastAPI app is driven in-process over ASGI, backed by an in-memory
+Mongo stand-in (mongomock-motor) and the fake LLM provider, so it needs no
+network or services. Pass --url to drive a running server instead (e.g. a local
+`uvicorn server:app`), or --mongo-url to back the in-process app with a real
+MongoDB.
+
+Virtual users run a weighted mix of login, dashboard loads, template browsing,
+automation CRUD and AI suggestions. Per-endpoint p50/p95/p99 and requests/sec are
+printed and optionally written as JSON, and can be compared with a stored
+baseline:
+
+    python benchmarks/load.py --users 50 --duration 20 --out results.json
+    python benchmarks/load.py --save-baseline benchmarks/baseline.json
+    python benchmarks/load.py --baseline benchmarks/baseline.json --max-regression 0.2
+
+The committed benchmarks/baseline.json was recorded with the defaults (20 users,
+10 s, in-process). Numbers depend on the machine, so re-record it with
+--save-baseline on the machine that runs the comparison.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+PROMPTS = [
+    "send weekly report to slack",
+    "sync leads from gmail to my crm",
+    "extract invoice totals from pdfs",
+    "notify the team when a pto form is submitted",
+    "post a daily standup summary",
+]
+CATEGORIES = ["all", "sales", "finance", "hr", "marketing", "operations"]
+
+# (operation, weight)
+WORKLOAD = [
+    ("login", 5),
+    ("dashboard", 30),
+    ("templates", 20),
+    ("crud", 20),
+    ("activity", 10),
+    ("ai_suggest", 10),
+    ("run", 5),
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    async def call(self, client: httpx.AsyncClient, label: str, method: str, url: str, expected=(), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code < 400 or response.status_code in expected
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.latencies.setdefault(label, []).append(time.perf_counter() - started)
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+        return response
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for label, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            endpoints[label] = {
+                "requests": len(samples),
+                "errors": self.errors.get(label, 0),
+                "rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+            }
+        return endpoints
+
+
+def percentile(samples: list, q: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+async def virtual_user(client: httpx.AsyncClient, rec: Recorder, deadline: float, index: int):
+    email = f"bench-{index}-{uuid.uuid4().hex[:8]}@example.com"
+    password = "bench-password"
+    response = await rec.call(client, "POST /auth/register", "POST", "/api/auth/register",
+                              json={"name": f"Bench {index}", "email": email, "password": password})
+    if response is None or response.status_code != 200:
+        return
+    auth = {"Authorization": f"Bearer {response.json()['token']}"}
+    automation_ids = []
+    operations, weights = zip(*WORKLOAD)
+
+    while time.perf_counter() < deadline:
+        op = random.choices(operations, weights)[0]
+        if op == "login":
+            await rec.call(client, "POST /auth/login", "POST", "/api/auth/login", json={"email": email, "password": password})
+        elif op == "dashboard":
+            await asyncio.gather(
+                rec.call(client, "GET /automations", "GET", "/api/automations", headers=auth),
+                rec.call(client, "GET /dashboard/stats", "GET", "/api/dashboard/stats", headers=auth),
+            )
+        elif op == "templates":
+            await rec.call(client, "GET /templates", "GET", "/api/templates", params={"category": random.choice(CATEGORIES)})
+        elif op == "crud":
+            if len(automation_ids) < 5 or random.random() < 0.4:
+                response = await rec.call(client, "POST /automations", "POST", "/api/automations", headers=auth, json={
+                    "name": f"Bench automation {uuid.uuid4().hex[:6]}",
+                    "template_id": f"t{random.randint(1, 12)}",
+                    "nodes": [{"type": "trigger", "value": "Bench"}, {"type": "action", "value": "Do work"}],
+                })
+                if response is not None and response.status_code == 200:
+                    automation_ids.append(response.json()["id"])
+            elif random.random() < 0.7:
+                await rec.call(client, "PUT /automations/{id}/toggle", "PUT",
+                               f"/api/automations/{random.choice(automation_ids)}/toggle", headers=auth)
+            else:
+                await rec.call(client, "DELETE /automations/{id}", "DELETE",
+                               f"/api/automations/{automation_ids.pop()}", headers=auth)
+        elif op == "activity":
+            await rec.call(client, "GET /activity", "GET", "/api/activity", headers=auth)
+        elif op == "ai_suggest":
+            await rec.call(client, "POST /ai/suggest", "POST", "/api/ai/suggest", headers=auth,
+                           json={"message": random.choice(PROMPTS)})
+        elif op == "run" and automation_ids:
+            # 409 is the expected answer for automations this user has paused
+            await rec.call(client, "POST /automations/{id}/run", "POST",
+                           f"/api/automations/{random.choice(automation_ids)}/run", headers=auth, expected=(409,))
+
+
+def load_app(mongo_url: str):
+    os.environ.setdefault("MONGO_URL", mongo_url or "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", f"flowforge_bench_{uuid.uuid4().hex[:8]}")
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    # Every virtual user shares one client IP; measure the handlers, not the limiter
+    os.environ.setdefault("RATE_LIMITS_ENABLED", "0")
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    if mongo_url:
+        return server.create_app()
+    from mongomock_motor import AsyncMongoMockClient
+    return server.create_app(database=AsyncMongoMockClient()[os.environ["DB_NAME"]])
+
+
+async def run(args) -> dict:
+    async with contextlib.AsyncExitStack() as stack:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=30)
+        else:
+            app = load_app(args.mongo_url)
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30)
+
+        rec = Recorder()
+        started = time.perf_counter()
+        deadline = started + args.duration
+        async with client:
+            await asyncio.gather(*(virtual_user(client, rec, deadline, i) for i in range(args.users)))
+        elapsed = time.perf_counter() - started
+
+    total = sum(len(s) for s in rec.latencies.values())
+    return {
+        "config": {"users": args.users, "duration": args.duration, "target": args.url or "in-process"},
+        "elapsed_s": round(elapsed, 2),
+        "total_rps": round(total / elapsed, 2),
+        "endpoints": rec.summary(elapsed),
+    }
+
+
+def compare(result: dict, baseline: dict, max_regression: float) -> list:
+    regressions = []
+    for label, current in result["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(label)
+        if not base:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if base[metric] and current[metric] > base[metric] * (1 + max_regression):
+                regressions.append(f"{label} {metric}: {base[metric]} -> {current[metric]}")
+        if base["rps"] and current["rps"] < base["rps"] * (1 - max_regression):
+            regressions.append(f"{label} rps: {base['rps']} -> {current['rps']}")
+    return regressions
+
+
+def print_table(result: dict):
+    print(f"{'endpoint':<32}{'reqs':>8}{'err':>6}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, e in result["endpoints"].items():
+        print(f"{label:<32}{e['requests']:>8}{e['errors']:>6}{e['rps']:>9}{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}")
+    print(f"total: {result['total_rps']} req/s over {result['elapsed_s']}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--mongo-url", help="back the in-process app with this MongoDB instead of the stand-in")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", help="write results JSON here as the new baseline")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed fractional regression vs baseline")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print_table(result)
+    for path in filter(None, (args.out, args.save_baseline)):
+        Path(path).write_text(json.dumps(result, indent=2) + "\n")
+
+    if args.baseline:
+        regressions = compare(result, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        if regressions:
+            print("Regressions beyond threshold:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions beyond threshold")
+
+
+if __name__ == "__main__":
+    main()
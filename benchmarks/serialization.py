@@ -0,0 +1,88 @@
+"""Per-endpoint JSON serialization microbenchmark.
+
+Compares FastAPI's default path (jsonable_encoder + JSONResponse) with the
+ORJSONResponse path the API handlers now return directly, using payloads shaped
+like real responses.
+
+    python benchmarks/serialization.py [--rows 100] [--nodes 50] [--repeat 200]
+"""
+import argparse
+import json
+import timeit
+import uuid
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def automation(nodes: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "name": "Weekly report to Slack",
+        "description": "Compile weekly metrics and post summary to your Slack channel",
+        "trigger": "Every Monday 9 AM",
+        "action": "Post report to Slack",
+        "status": "active",
+        "category": "marketing",
+        "template_id": "t4",
+        "nodes": [{"type": "action" if i % 2 else "trigger", "value": f"Step {i}: do the thing"} for i in range(nodes)],
+        "tasks_run": 42,
+        "time_saved_minutes": 20,
+        "user_id": str(uuid.uuid4()),
+        "created_at": now(),
+    }
+
+
+def activity() -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": str(uuid.uuid4()),
+        "action": "automation_toggled",
+        "detail": "Weekly report to Slack → paused",
+        "timestamp": now(),
+    }
+
+
+def payloads(rows: int, nodes: int) -> dict:
+    user = {"id": str(uuid.uuid4()), "name": "Ada", "email": "ada@example.com", "job_title": "Ops",
+            "industry": "SaaS", "onboarded": True, "created_at": now()}
+    return {
+        "GET /api/automations": [automation(nodes) for _ in range(rows)],
+        "GET /api/activity": [activity() for _ in range(rows)],
+        "GET /api/auth/me": user,
+        "POST /api/auth/login": {"token": "x" * 180, "user": user},
+        "GET /api/dashboard/stats": {"active_automations": 7, "total_automations": 9, "tasks_run": 1234,
+                                     "hours_saved": 12.5, "productivity_value": 1875.0},
+    }
+
+
+def default_path(content):
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def fast_path(content):
+    return ORJSONResponse(content).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100, help="rows per list endpoint")
+    parser.add_argument("--nodes", type=int, default=50, help="nodes per automation")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<26}{'before µs':>12}{'after µs':>12}{'speedup':>10}")
+    for endpoint, content in payloads(args.rows, args.nodes).items():
+        assert json.loads(default_path(content)) == json.loads(fast_path(content))
+        before = min(timeit.repeat(lambda: default_path(content), number=args.repeat, repeat=3)) / args.repeat
+        after = min(timeit.repeat(lambda: fast_path(content), number=args.repeat, repeat=3)) / args.repeat
+        print(f"{endpoint:<26}{before * 1e6:>12.1f}{after * 1e6:>12.1f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -38,6 +38,7 @@ export default function DashboardPage() {
   const [aiQuery, setAiQuery] = useState("");
   const [aiLoading, setAiLoading] = useState(false);
   const [loading, setLoading] = useState(true);
+  const [live, setLive] = useState(false);
 
   const headers = useCallback(() => ({ Authorization: `Bearer ${token}` }), [token]);
 
@@ -56,14 +57,62 @@ export default function DashboardPage() {
     }
   }, [API, headers]);
 
-  useEffect(() => { fetchData(); }, [fetchData]);
+  // With live updates the stream's first resync event does the initial load
+  useEffect(() => { if (typeof EventSource === "undefined") fetchData(); }, [fetchData]);
+
+  // Server-pushed deltas; while connected, actions below skip the full refetch
+  useEffect(() => {
+    if (!token || typeof EventSource === "undefined") return;
+    let source = null;
+    let retry = null;
+    let cancelled = false;
+    let lastEventId = null;
+    // The URL only carries a short-lived live token, so every (re)connect fetches a new one
+    // and hands the server the last event seen; it replays what was missed, or sends resync
+    const connect = async () => {
+      try {
+        const res = await axios.post(`${API}/live/token`, {}, { headers: headers() });
+        if (cancelled) return;
+        const resume = lastEventId ? `&last_event_id=${encodeURIComponent(lastEventId)}` : "";
+        source = new EventSource(`${API}/live?token=${encodeURIComponent(res.data.token)}${resume}`);
+      } catch (err) {
+        if (cancelled) return;
+        // Never connected yet: load the page the plain way while retrying
+        if (lastEventId === null) fetchData();
+        retry = setTimeout(connect, 5000);
+        return;
+      }
+      const on = (event, handler) => source.addEventListener(event, (e) => {
+        if (e.lastEventId) lastEventId = e.lastEventId;
+        handler(JSON.parse(e.data));
+      });
+      on("ready", () => setLive(true));
+      on("resync", () => fetchData());
+      on("stats", (data) => setStats(data));
+      on("automation", (data) => setAutomations(prev =>
+        prev.some(a => a.id === data.id) ? prev.map(a => a.id === data.id ? data : a) : [data, ...prev]
+      ));
+      on("automation_deleted", (data) => setAutomations(prev => prev.filter(a => a.id !== data.id)));
+      source.onerror = () => {
+        setLive(false);
+        source.close();
+        retry = setTimeout(connect, 2000);
+      };
+    };
+    connect();
+    return () => {
+      cancelled = true;
+      clearTimeout(retry);
+      if (source) source.close();
+    };
+  }, [API, token, headers, fetchData]);
 
   const toggleAutomation = async (id) => {
     try {
       const res = await axios.put(`${API}/automations/${id}/toggle`, {}, { headers: headers() });
       setAutomations(prev => prev.map(a => a.id === id ? { ...a, status: res.data.status } : a));
       toast.success(`Automation ${res.data.status}`);
-      fetchData();
+      if (!live) fetchData();
     } catch (err) {
       toast.error("Failed to toggle automation");
     }
@@ -74,7 +123,7 @@ export default function DashboardPage() {
       await axios.delete(`${API}/automations/${id}`, { headers: headers() });
       setAutomations(prev => prev.filter(a => a.id !== id));
       toast.success("Automation deleted");
-      fetchData();
+      if (!live) fetchData();
     } catch (err) {
       toast.error("Failed to delete");
     }
@@ -89,11 +138,11 @@ export default function DashboardPage() {
       // Auto-create the automation
       await axios.post(`${API}/automations`, {
         name: s.name, description: s.description, trigger: s.trigger,
-        action: s.action, category: s.category,
+        action: s.action, category: s.category, template_id: s.template_id,
       }, { headers: headers() });
       toast.success(s.suggestion || "Automation created from your description!");
       setAiQuery("");
-      fetchData();
+      if (!live) fetchData();
     } catch (err) {
       toast.error("AI suggestion failed. Try again.");
     } finally {
@@ -0,0 +1,63 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+# server.py reads its configuration at import time
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "flowforge_test")
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LLM_FAKE_LATENCY", "0")
+os.environ.setdefault("ACTIVITY_WRITE_BEHIND", "0")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = AsyncMongoMockClient()[f"test_{uuid.uuid4().hex}"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+@pytest.fixture
+def client(database, monkeypatch):
+    # Every TestClient request comes from the same address; start each test with full buckets
+    monkeypatch.setattr(server, "rate_buckets", server.TokenBuckets(server.RATE_LIMIT_SHARDS, server.RATE_LIMIT_SHARD_SIZE))
+    with TestClient(server.create_app(database=database)) as client:
+        yield client
+
+
+@pytest.fixture
+def auth(client):
+    def register(email="user@example.com"):
+        response = client.post("/api/auth/register", json={"name": "Test", "email": email, "password": "secret"})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['token']}"}
+    return register
+
+
+@pytest.fixture
+def pages(client):
+    """Walk a keyset-paged endpoint, returning the list of pages."""
+    def walk(path, headers, limit):
+        result, cursor = [], None
+        while True:
+            response = client.get(path, params={"limit": limit, **({"cursor": cursor} if cursor else {})}, headers=headers)
+            assert response.status_code == 200, response.text
+            result.append(response.json())
+            cursor = response.headers.get(server.NEXT_CURSOR_HEADER)
+            if not cursor:
+                return result
+    return walk
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+
+@pytest.mark.parametrize("limit", [1, 4, 6, 25])
+def test_activity_paging_continues_into_the_archive(client, auth, database, pages, limit):
+    headers = auth()
+    for i in range(12):
+        client.post("/api/automations", json={"name": f"a{i}"}, headers=headers)
+    before = [row for page in pages("/api/activity", headers, limit) for row in page]
+
+    async def archive_oldest(count):
+        old = await database.activity_log.find({}).sort("timestamp", 1).limit(count).to_list(None)
+        # Old enough for the archiver, young enough that mongomock's TTL does not expire them
+        aged = datetime.now(timezone.utc) - timedelta(days=server.ACTIVITY_HOT_DAYS + 1)
+        await database.activity_log.update_many({"_id": {"$in": [d["_id"] for d in old]}}, {"$set": {"logged_at": aged}})
+        while await server.archive_activity_batch(datetime.now(timezone.utc) - timedelta(days=server.ACTIVITY_HOT_DAYS)):
+            pass
+
+    client.portal.call(archive_oldest, 7)
+    assert client.portal.call(database.activity_log.count_documents, {}) == len(before) - 7
+    after = [row for page in pages("/api/activity", headers, limit) for row in page]
+    assert [row["id"] for row in after] == [row["id"] for row in before]
+    assert not any("logged_at" in row for row in after)
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def writer(database, monkeypatch):
+    writer = server.BatchWriter("activity_log", 4, 2, 60)
+    monkeypatch.setattr(server, "activity_writer", writer)
+    monkeypatch.setattr(server, "ACTIVITY_WRITE_BEHIND", True)
+    return writer
+
+
+@pytest.mark.anyio
+async def test_activity_is_buffered_until_flushed(database, writer):
+    writer.start()
+    await server.log_activity("u1", "automation_created", "Created: a")
+    assert await database.activity_log.count_documents({}) == 0
+    # Durable entries skip the buffer
+    await server.log_activity("u1", "onboarding_complete", "Onboarded", durable=True)
+    assert await database.activity_log.count_documents({}) == 1
+    await writer.stop()
+    rows = await database.activity_log.find({}, {"_id": 0}).to_list(None)
+    assert sorted(r["action"] for r in rows) == ["automation_created", "onboarding_complete"]
+    assert all(r["user_id"] == "u1" and r["logged_at"] for r in rows)
+
+
+@pytest.mark.anyio
+async def test_a_full_batch_is_written_without_waiting_for_the_interval(database, writer):
+    writer.start()
+    await server.log_activities("u1", [("a", "1"), ("b", "2")])
+    for _ in range(100):
+        if await database.activity_log.count_documents({}) == 2:
+            break
+        await asyncio.sleep(0.01)
+    assert writer.stats()["written"] == 2
+    await writer.stop()
+
+
+@pytest.mark.anyio
+async def test_submit_waits_for_space_when_the_buffer_is_full(database, writer):
+    for i in range(4):
+        await writer.submit({"id": str(i)})
+    blocked = asyncio.create_task(writer.submit({"id": "4"}))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+    await writer.flush()
+    await asyncio.wait_for(blocked, 1)
+    assert writer.stats()["buffered"] == 1
+
+
+@pytest.mark.anyio
+async def test_writes_go_straight_to_the_database_when_the_writer_is_stopped(database, writer):
+    await server.log_activity("u1", "automation_deleted", "Deleted automation x")
+    assert await database.activity_log.count_documents({}) == 1
@@ -0,0 +1,13 @@
+from fastapi.testclient import TestClient
+
+import server
+
+
+def test_apps_can_run_one_after_another(database):
+    for _ in range(2):
+        with TestClient(server.create_app(database=database)) as client:
+            assert server.password_hasher._executor is not None
+            response = client.post("/api/auth/register", json={"name": "T", "email": f"{id(client)}@example.com", "password": "secret"})
+            assert response.status_code == 200
+        # The pool is only ever created by start(); a stopped app leaves none behind
+        assert server.password_hasher._executor is None
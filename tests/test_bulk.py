@@ -0,0 +1,74 @@
+import server
+
+
+def stats(client, headers):
+    response = client.get("/api/dashboard/stats", headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    return body["total_automations"], body["active_automations"]
+
+
+def create(client, headers, count):
+    response = client.post("/api/automations/bulk", json={"automations": [{"name": f"a{i}"} for i in range(count)]}, headers=headers)
+    assert response.status_code == 200, response.text
+    return [a["id"] for a in response.json()]
+
+
+def actions(client, headers, action):
+    return [a["detail"] for a in client.get("/api/activity", headers=headers).json() if a["action"] == action]
+
+
+def test_bulk_create(client, auth):
+    headers = auth()
+    ids = create(client, headers, 3)
+    assert len(set(ids)) == 3
+    assert stats(client, headers) == (3, 3)
+    assert sorted(actions(client, headers, "automation_created")) == ["Created: a0", "Created: a1", "Created: a2"]
+    too_many = {"automations": [{"name": "x"}] * (server.BULK_MAX + 1)}
+    assert client.post("/api/automations/bulk", json=too_many, headers=headers).status_code == 422
+
+
+def test_bulk_status_only_counts_real_changes(client, auth):
+    headers = auth()
+    ids = create(client, headers, 4)
+    response = client.post("/api/automations/bulk/status", json={"ids": ids[:2], "status": "paused"}, headers=headers)
+    assert response.json() == {"status": "paused", "updated": 2}
+    # Two of these are already paused
+    response = client.post("/api/automations/bulk/status", json={"ids": ids[:3], "status": "paused"}, headers=headers)
+    assert response.json() == {"status": "paused", "updated": 1}
+    assert stats(client, headers) == (4, 1)
+    assert len(actions(client, headers, "automation_toggled")) == 3
+    assert client.post("/api/automations/bulk/status", json={"ids": ids, "status": "stopped"}, headers=headers).status_code == 422
+
+
+def test_bulk_operations_ignore_other_users_automations(client, auth):
+    mine, theirs = auth("me@example.com"), auth("them@example.com")
+    ids = create(client, mine, 2)
+    other = create(client, theirs, 1)
+    response = client.post("/api/automations/bulk/status", json={"ids": ids + other, "status": "paused"}, headers=mine)
+    assert response.json()["updated"] == 2
+    response = client.post("/api/automations/bulk/delete", json={"ids": ids + other}, headers=mine)
+    assert response.json() == {"status": "deleted", "deleted": 2}
+    assert stats(client, mine) == (0, 0)
+    assert stats(client, theirs) == (1, 1)
+
+
+def test_bulk_delete_updates_stats(client, auth):
+    headers = auth()
+    ids = create(client, headers, 3)
+    client.put(f"/api/automations/{ids[0]}/toggle", headers=headers)
+    response = client.post("/api/automations/bulk/delete", json={"ids": ids[:2] + ["missing"]}, headers=headers)
+    assert response.json() == {"status": "deleted", "deleted": 2}
+    assert stats(client, headers) == (1, 1)
+    assert [a["id"] for a in client.get("/api/automations", headers=headers).json()] == ids[2:]
+
+
+def test_toggle_flips_and_reports_the_new_status(client, auth):
+    headers = auth()
+    [auto_id] = create(client, headers, 1)
+    assert client.put(f"/api/automations/{auto_id}/toggle", headers=headers).json() == {"status": "paused"}
+    assert stats(client, headers) == (1, 0)
+    assert client.put(f"/api/automations/{auto_id}/toggle", headers=headers).json() == {"status": "active"}
+    assert stats(client, headers) == (1, 1)
+    assert actions(client, headers, "automation_toggled") == ["a0 → active", "a0 → paused"]
+    assert client.put("/api/automations/missing/toggle", headers=headers).status_code == 404
@@ -0,0 +1,74 @@
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+
+def export(client, headers, kind, **params):
+    response = client.get(f"/api/export/{kind}", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_every_row_carries_its_resume_cursor(client, auth, monkeypatch):
+    monkeypatch.setattr(server, "EXPORT_BATCH_SIZE", 2)
+    headers = auth()
+    for i in range(5):
+        client.post("/api/automations", json={"name": f"a{i}"}, headers=headers)
+    rows = export(client, headers, "automations")
+    assert [r["name"] for r in rows] == [f"a{i}" for i in range(5)]
+    assert all(server.decode_cursor(r["_cursor"]) == (r["created_at"], r["id"]) for r in rows)
+    # Resume after the second row, as a client cut off there would
+    resumed = export(client, headers, "automations", cursor=rows[1]["_cursor"])
+    assert [r["id"] for r in resumed] == [r["id"] for r in rows[2:]]
+    assert export(client, headers, "automations", cursor=rows[-1]["_cursor"]) == []
+
+
+def test_activity_export_resumes_across_the_archive(client, auth, database):
+    headers = auth()
+    for i in range(6):
+        client.post("/api/automations", json={"name": f"a{i}"}, headers=headers)
+
+    async def archive_oldest(count):
+        old = await database.activity_log.find({}).sort("timestamp", 1).limit(count).to_list(None)
+        aged = datetime.now(timezone.utc) - timedelta(days=server.ACTIVITY_HOT_DAYS + 1)
+        await database.activity_log.update_many({"_id": {"$in": [d["_id"] for d in old]}}, {"$set": {"logged_at": aged}})
+        while await server.archive_activity_batch(datetime.now(timezone.utc) - timedelta(days=server.ACTIVITY_HOT_DAYS)):
+            pass
+
+    client.portal.call(archive_oldest, 3)
+    assert client.portal.call(database.activity_log.count_documents, {}) == 3
+    rows = export(client, headers, "activity")
+    assert [r["detail"] for r in rows] == [f"Created: a{i}" for i in range(6)]
+    assert [(r["timestamp"], r["id"]) for r in rows] == sorted((r["timestamp"], r["id"]) for r in rows)
+    for i in (1, 3, 5):
+        resumed = export(client, headers, "activity", cursor=rows[i]["_cursor"])
+        assert [r["id"] for r in resumed] == [r["id"] for r in rows[i + 1:]]
+
+
+def test_export_is_gzipped_on_request(client, auth):
+    headers = auth()
+    client.post("/api/automations", json={"name": "zipped"}, headers=headers)
+    response = client.get("/api/export/automations", params={"gzip": "true"}, headers=headers)
+    assert response.headers["content-type"] == "application/gzip"
+    # httpx transparently decodes a gzip Content-Encoding, but this is a gzip file body
+    lines = gzip.decompress(response.content).splitlines()
+    assert json.loads(lines[0])["name"] == "zipped"
+
+
+@pytest.mark.parametrize("params", [{"since": "2026-10-01T00:00:00"}, {"until": "2026-10-01T12:00"}])
+def test_naive_bounds_are_rejected(client, auth, params):
+    assert client.get("/api/export/activity", params=params, headers=auth()).status_code == 400
+
+
+def test_bounds_with_an_offset_are_compared_in_utc(client, auth):
+    headers = auth()
+    client.post("/api/automations", json={"name": "a"}, headers=headers)
+    created = export(client, headers, "automations")[0]["created_at"]
+    moment = datetime.fromisoformat(created).astimezone(timezone(timedelta(hours=2)))
+    assert len(export(client, headers, "automations", since=moment.isoformat())) == 1
+    assert export(client, headers, "automations", until=moment.isoformat()) == []
+    assert client.get("/api/export/nope", headers=headers).status_code == 404
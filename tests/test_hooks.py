@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+import server
+
+
+class FlakyCollection:
+    """Stands in for a collection whose insert_many raises the queued errors first."""
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.docs = []
+
+    async def insert_many(self, docs, ordered=True):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.docs.extend(docs)
+
+
+@pytest.fixture
+def events(monkeypatch):
+    def use(*errors):
+        collection = FlakyCollection(*errors)
+        monkeypatch.setattr(server, "db", {"events": collection})
+        return collection
+    return use
+
+
+@pytest.mark.anyio
+async def test_failed_batch_is_kept_and_retried(events):
+    collection = events(AutoReconnect("primary stepped down"))
+    writer = server.BatchWriter("events", 10, 5, 0.01)
+    for i in range(3):
+        assert writer.offer({"_id": i})
+    assert await writer.flush() is False
+    assert writer.stats() == {"buffered": 3, "written": 0, "failed": 0, "retries": 1}
+    assert await writer.flush() is True
+    assert [d["_id"] for d in collection.docs] == [0, 1, 2]
+    assert writer.stats() == {"buffered": 0, "written": 3, "failed": 0, "retries": 1}
+
+
+@pytest.mark.anyio
+async def test_partial_bulk_error_counts_only_rejected_documents(events):
+    events(BulkWriteError({"nInserted": 2, "writeErrors": [
+        {"index": 1, "code": 121, "errmsg": "Document failed validation"},
+        # Written by an earlier attempt that failed after the server applied it
+        {"index": 3, "code": 11000, "errmsg": "E11000 duplicate key"},
+    ]}))
+    writer = server.BatchWriter("events", 10, 5, 0.01)
+    for i in range(4):
+        writer.offer({"_id": i})
+    assert await writer.flush() is True
+    assert writer.stats() == {"buffered": 0, "written": 3, "failed": 1, "retries": 0}
+
+
+@pytest.mark.anyio
+async def test_buffer_fills_while_the_database_is_down(events):
+    events(*[AutoReconnect("down")] * 2)
+    writer = server.BatchWriter("events", 2, 2, 0.01)
+    assert writer.offer({"_id": 0}) and writer.offer({"_id": 1})
+    assert not writer.offer({"_id": 2})
+    assert await writer.flush() is False
+    # The stalled batch left the queue; new documents fill it up again and are then refused
+    assert writer.offer({"_id": 2}) and writer.offer({"_id": 3})
+    assert not writer.offer({"_id": 4})
+
+
+@pytest.mark.anyio
+async def test_background_writer_retries_with_backoff(events):
+    collection = events(AutoReconnect("down"), AutoReconnect("down"))
+    writer = server.BatchWriter("events", 10, 5, 0.01)
+    writer.start()
+    writer.offer({"_id": 0})
+    for _ in range(100):
+        if collection.docs:
+            break
+        await asyncio.sleep(0.01)
+    await writer.stop()
+    assert collection.docs == [{"_id": 0}]
+    assert writer.stats()["retries"] == 2
+
+
+def hook_url(client, headers):
+    auto = client.post("/api/automations", json={"name": "hooked"}, headers=headers).json()
+    hook = client.get(f"/api/automations/{auto['id']}/hook", headers=headers).json()
+    return hook["url"], hook["token"]
+
+
+def test_hook_accepts_a_valid_token(client, auth):
+    url, token = hook_url(client, auth())
+    response = client.post(url, json={"n": 1}, headers={"X-Hook-Token": token})
+    assert response.status_code == 202
+    assert response.json()["accepted"] is True
+    assert client.post(url, params={"token": token}, json={}).status_code == 202
+
+
+def test_hook_rejects_a_bad_token(client, auth):
+    url, token = hook_url(client, auth())
+    assert client.post(url, json={}).status_code == 401
+    assert client.post(url, json={}, headers={"X-Hook-Token": token[:-1] + ("1" if token.endswith("0") else "0")}).status_code == 401
+    # A token is only valid for the automation it was issued for
+    other, _ = hook_url(client, auth("other@example.com"))
+    assert client.post(other, json={}, headers={"X-Hook-Token": token}).status_code == 401
+
+
+def test_hook_rejects_oversized_and_invalid_payloads(client, auth, monkeypatch):
+    monkeypatch.setattr(server, "HOOK_MAX_BYTES", 64)
+    url, token = hook_url(client, auth())
+    headers = {"X-Hook-Token": token}
+    assert client.post(url, content=b'{"x": "' + b"a" * 64 + b'"}', headers=headers).status_code == 413
+    assert client.post(url, content=b"not json", headers=headers).status_code == 400
+
+
+def test_hook_returns_429_when_the_buffer_is_full(client, auth, monkeypatch):
+    url, token = hook_url(client, auth())
+    monkeypatch.setattr(server.hook_writer, "offer", lambda event: False)
+    rejected = server.hooks_rejected
+    response = client.post(url, json={}, headers={"X-Hook-Token": token})
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+    assert server.hooks_rejected == rejected + 1
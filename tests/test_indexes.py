@@ -0,0 +1,67 @@
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import server
+
+
+@pytest.mark.anyio
+async def test_every_declared_index_is_created(database):
+    await server.ensure_indexes()
+    for collection, keys, options in server.INDEXES:
+        info = await database[collection].index_information()
+        matching = [spec for spec in info.values() if spec["key"] == keys]
+        assert matching, f"{collection} {keys}"
+        for option, value in options.items():
+            assert matching[0].get(option) == value
+
+
+@pytest.mark.anyio
+async def test_unique_email_index_rejects_duplicates(database):
+    await server.ensure_indexes()
+    await database.users.insert_one({"id": "1", "email": "a@example.com"})
+    with pytest.raises(DuplicateKeyError):
+        await database.users.insert_one({"id": "2", "email": "a@example.com"})
+
+
+def test_plan_stages_walks_nested_plans():
+    plan = {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}},
+            "inputStages": [{"stage": "SORT_MERGE"}]}
+    assert server.plan_stages(plan) == {"LIMIT", "FETCH", "IXSCAN", "SORT_MERGE"}
+
+
+class ExplainingCursor:
+    def __init__(self, stage):
+        self.stage = stage
+
+    def sort(self, *args):
+        return self
+
+    async def explain(self):
+        return {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": self.stage}}}}
+
+
+class ExplainingCollection:
+    def __init__(self, stage):
+        self.stage = stage
+
+    def find(self, query):
+        return ExplainingCursor(self.stage)
+
+
+class ExplainingDatabase:
+    def __init__(self, scanning):
+        self.scanning = scanning
+
+    def __getitem__(self, name):
+        return ExplainingCollection("COLLSCAN" if name in self.scanning else "IXSCAN")
+
+
+@pytest.mark.anyio
+async def test_query_plan_verification_reports_collection_scans(monkeypatch):
+    monkeypatch.setattr(server, "db", ExplainingDatabase(set()))
+    await server.verify_query_plans()
+    monkeypatch.setattr(server, "db", ExplainingDatabase({"activity_archive"}))
+    with pytest.raises(RuntimeError) as excinfo:
+        await server.verify_query_plans()
+    assert "get_activity (archive)" in str(excinfo.value)
+    assert "get_automations" not in str(excinfo.value)
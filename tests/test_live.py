@@ -0,0 +1,80 @@
+import pytest
+
+import server
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    feed = server.LiveFeed(1, 100)
+    monkeypatch.setattr(server, "live_feed", feed)
+    monkeypatch.setattr(server, "LIVE_COALESCE", 0)
+    return feed
+
+
+async def take(stream, count):
+    return [await stream.__anext__() for _ in range(count)]
+
+
+@pytest.mark.anyio
+async def test_fresh_connection_is_told_to_resync(feed):
+    feed.publish("u1", ("stats",), "stats", {"tasks_run": 1})
+    first = feed.position()
+    stream = server.live_events("u1", None)
+    retry, ready, resync = await take(stream, 3)
+    assert retry == "retry: 2000\n\n"
+    assert ready.startswith(f"id: {first}\nevent: ready\n")
+    assert resync.startswith(f"id: {first}\nevent: resync\n")
+    await stream.aclose()
+    assert feed.stats()["connections"] == 0
+
+
+@pytest.mark.anyio
+async def test_reconnect_replays_only_what_was_missed(feed):
+    feed.publish("u1", ("stats",), "stats", {"tasks_run": 1})
+    seen = feed.position()
+    feed.publish("u2", ("stats",), "stats", {"tasks_run": 7})
+    feed.publish("u1", ("automation", "a1"), "automation", {"id": "a1"})
+    missed = feed.position()
+    stream = server.live_events("u1", seen)
+    _, ready, event = await take(stream, 3)
+    assert ready.startswith(f"id: {seen}\nevent: ready\n")
+    assert event == f'id: {missed}\nevent: automation\ndata: {{"id": "a1"}}\n\n'
+    await stream.aclose()
+    assert feed.resyncs == 0
+
+
+@pytest.mark.anyio
+async def test_unknown_event_id_resyncs(feed):
+    feed.publish("u1", ("stats",), "stats", {})
+    stream = server.live_events("u1", "other-worker-42")
+    _, _, resync = await take(stream, 3)
+    assert "event: resync\n" in resync
+    await stream.aclose()
+    assert feed.resyncs == 1
+
+
+def test_live_takes_the_resume_point_from_query_or_header(client, auth, monkeypatch):
+    calls = []
+
+    async def events(user_id, last_event_id):
+        calls.append(last_event_id)
+        yield "retry: 2000\n\n"
+
+    monkeypatch.setattr(server, "live_events", events)
+    token = client.post("/api/live/token", headers=auth()).json()["token"]
+    assert client.get("/api/live", params={"token": token}).status_code == 200
+    client.get("/api/live", params={"token": token, "last_event_id": "w-3"})
+    client.get("/api/live", params={"token": token, "last_event_id": "w-3"}, headers={"Last-Event-ID": "w-4"})
+    assert calls == [None, "w-3", "w-4"]
+
+
+def test_live_token_is_scoped_to_the_stream(client, auth):
+    headers = auth()
+    session = headers["Authorization"].split()[1]
+    assert client.get("/api/live", params={"token": session}).status_code == 401
+    live = client.post("/api/live/token", headers=headers).json()["token"]
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {live}"}).status_code == 401
+    user_id = client.get("/api/auth/me", headers=headers).json()["id"]
+    expired = server.create_scoped_token(user_id, "live", -5)
+    assert client.get("/api/live", params={"token": expired}).status_code == 401
+    assert client.get("/api/live").status_code == 401
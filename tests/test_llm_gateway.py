@@ -0,0 +1,77 @@
+import pytest
+
+import server
+
+
+async def collect(gateway, message="weekly report"):
+    return "".join([chunk async for chunk in gateway.stream(message)])
+
+
+def gateway(provider, threshold=2, cooldown=60.0, timeout=1.0):
+    gateway = server.LLMGateway(provider, 4, timeout, server.CircuitBreaker(threshold, cooldown))
+    gateway.start()
+    return gateway
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = server.CircuitBreaker(2, 60)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_trial(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    breaker = server.CircuitBreaker(1, 30)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock[0] += 30
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only the one trial call goes through until it reports back
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+@pytest.mark.anyio
+async def test_gateway_short_circuits_while_open():
+    failing = gateway(server.FakeProvider(latency=0, failure_rate=1.0))
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await collect(failing)
+    assert failing.breaker.state == "open"
+    with pytest.raises(server.LLMUnavailable):
+        await collect(failing)
+    assert failing.stats()["short_circuited"] == 1
+    assert failing.in_flight == 0
+
+
+@pytest.mark.anyio
+async def test_gateway_half_open_success_closes_breaker():
+    healthy = gateway(server.FakeProvider(latency=0, failure_rate=0.0), cooldown=0)
+    healthy.breaker.record_failure()
+    healthy.breaker.record_failure()
+    assert healthy.breaker.state == "open"
+    text = await collect(healthy, "send invoices")
+    assert '"description": "send invoices"' in text
+    assert healthy.breaker.state == "closed"
+
+
+@pytest.mark.anyio
+async def test_gateway_deadline_counts_as_failure():
+    slow = gateway(server.FakeProvider(latency=1.0, failure_rate=0.0), threshold=1, timeout=0.05)
+    with pytest.raises(server.LLMUnavailable):
+        await collect(slow)
+    assert slow.timeouts == 1
+    assert slow.breaker.state == "open"
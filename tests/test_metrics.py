@@ -0,0 +1,44 @@
+import server
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = server.Histogram("h_seconds", "help", ("route",), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(("/a",), seconds)
+    assert histogram.render() == [
+        "# HELP h_seconds help",
+        "# TYPE h_seconds histogram",
+        'h_seconds_bucket{route="/a",le="0.1"} 2',
+        'h_seconds_bucket{route="/a",le="1.0"} 3',
+        'h_seconds_bucket{route="/a",le="+Inf"} 4',
+        'h_seconds_sum{route="/a"} 3.65',
+        'h_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = server.Counter("c_total", "help", ("path",))
+    counter.inc(('a"b\\c\nd',), 2)
+    assert counter.render()[-1] == 'c_total{path="a\\"b\\\\c\\nd"} 2'
+
+
+def test_gauge_tracks_ups_and_downs():
+    gauge = server.Gauge("g", "help")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert gauge.render()[-1] == "g 1"
+
+
+def test_requests_are_labelled_by_route_template(client, auth):
+    headers = auth()
+    client.put("/api/automations/some-id/toggle", headers=headers)
+    client.get("/api/does-not-exist")
+    body = client.get("/metrics").text
+    # Counters are process-wide, so only the series (not its count) is checked
+    assert 'flowforge_http_requests_total{method="PUT",route="/api/automations/{auto_id}/toggle",status="404"}' in body
+    assert 'route="unmatched",status="404"' in body
+    assert "some-id" not in body
+    assert 'flowforge_password_hash_duration_seconds_count{op="hash_password"}' in body
+    assert 'flowforge_component_stat{component="password_hasher",stat="capacity"}' in body
+    assert "flowforge_http_requests_in_flight" in body
@@ -0,0 +1,37 @@
+import base64
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def test_cursor_round_trip():
+    cursor = server.encode_cursor("2026-10-17T09:00:00+00:00", "abc")
+    assert "=" not in cursor
+    assert server.decode_cursor(cursor) == ("2026-10-17T09:00:00+00:00", "abc")
+
+
+@pytest.mark.parametrize("cursor", ["zz", base64.urlsafe_b64encode(b'[1, "x"]').decode(), base64.urlsafe_b64encode(b"{}").decode()])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        server.decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+
+def test_page_query_is_strictly_after_the_cursor():
+    query = server.page_query("u1", "created_at", server.encode_cursor("t5", "id5"))
+    assert query == {"user_id": "u1", "$or": [
+        {"created_at": {"$lt": "t5"}},
+        {"created_at": "t5", "id": {"$lt": "id5"}},
+    ]}
+
+
+def test_keyset_paging_over_automations(client, auth, pages):
+    headers = auth()
+    for i in range(7):
+        client.post("/api/automations", json={"name": f"a{i}"}, headers=headers)
+    result = pages("/api/automations", headers, 3)
+    assert [len(page) for page in result] == [3, 3, 1]
+    assert [a["name"] for page in result for a in page] == [f"a{i}" for i in reversed(range(7))]
+    assert client.get("/api/automations", params={"cursor": "zz"}, headers=headers).status_code == 400
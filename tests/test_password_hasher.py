@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+@pytest.fixture
+def hasher(monkeypatch):
+    monkeypatch.setattr(server, "BCRYPT_ROUNDS", 4)
+    hasher = server.PasswordHasher(2, 1)
+    hasher.start()
+    yield hasher
+    hasher.shutdown()
+
+
+@pytest.mark.anyio
+async def test_hash_and_verify_round_trip(hasher):
+    hashed = await hasher.hash("secret")
+    assert hashed.startswith("$2b$04$")
+    assert await hasher.verify("secret", hashed) is True
+    assert await hasher.verify("wrong", hashed) is False
+    assert hasher.stats() == {"pending": 0, "capacity": 3, "rejected": 0}
+
+
+@pytest.mark.anyio
+async def test_work_runs_off_the_event_loop(hasher):
+    def slow():
+        time.sleep(0.2)
+        return threading.current_thread().name
+
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    name = await hasher._run(slow)
+    ticker.cancel()
+    assert name.startswith("bcrypt")
+    assert ticks >= 5
+
+
+@pytest.mark.anyio
+async def test_calls_beyond_capacity_are_rejected(hasher):
+    release = threading.Event()
+    busy = [asyncio.create_task(hasher._run(release.wait)) for _ in range(3)]
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException) as excinfo:
+        await hasher.hash("secret")
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.headers == {"Retry-After": "1"}
+    assert hasher.stats()["rejected"] == 1
+    release.set()
+    await asyncio.gather(*busy)
+    assert hasher.pending == 0
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+@pytest.mark.anyio
+async def test_await_chain_follows_suspended_coroutines():
+    gate = asyncio.get_running_loop().create_future()
+
+    async def inner():
+        await gate
+
+    async def outer():
+        await inner()
+
+    task = asyncio.create_task(outer())
+    await asyncio.sleep(0)
+    chain = server.await_chain(task.get_coro())
+    assert [frame.split(" ")[0] for frame in chain][:2] == ["outer", "inner"]
+    gate.set_result(None)
+    await task
+
+
+def test_collapsed_stacks_are_most_common_first():
+    stacks = server.StackCounter({"a;b": 2, "a;c": 5})
+    assert server.collapsed(stacks) == "a;c 5\na;b 2\n"
+
+
+def test_admin_endpoints_need_the_admin_token(client, monkeypatch):
+    assert client.get("/api/admin/profiles").status_code == 403
+    monkeypatch.setattr(server, "PROFILE_ADMIN_TOKEN", "s3cret")
+    assert client.get("/api/admin/profiles", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/api/admin/profiles", headers={"X-Admin-Token": "s3cret"}).status_code == 200
+
+
+def test_requests_are_profiled_only_on_request(client, monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_ADMIN_TOKEN", "s3cret")
+    admin = {"X-Admin-Token": "s3cret"}
+    assert "x-profile-id" not in client.get("/api/templates").headers
+    assert "x-profile-id" not in client.get("/api/templates", headers={"X-Profile": "guess"}).headers
+
+    profile_id = client.get("/api/templates", headers={"X-Profile": "s3cret"}).headers["x-profile-id"]
+    listed = client.get("/api/admin/profiles", headers=admin).json()
+    assert listed[0]["id"] == profile_id
+    assert (listed[0]["method"], listed[0]["route"]) == ("GET", "/api/templates")
+    assert "stacks" not in listed[0]
+    response = client.get(f"/api/admin/profiles/{profile_id}", headers=admin)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert client.get("/api/admin/profiles/missing", headers=admin).status_code == 404
+
+
+def test_worker_window_can_be_started(client, monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_ADMIN_TOKEN", "s3cret")
+    admin = {"X-Admin-Token": "s3cret"}
+    assert client.post("/api/admin/profiles/worker", params={"seconds": 0.05}, headers=admin).json() == {"status": "sampling", "seconds": 0.05}
+    assert client.post("/api/admin/profiles/worker", params={"seconds": 601}, headers=admin).status_code == 422
+    assert client.get("/api/admin/profiles/worker", headers=admin).status_code == 200
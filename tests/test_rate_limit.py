@@ -0,0 +1,70 @@
+import pytest
+
+import server
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_parse_rate():
+    assert server.parse_rate("10/60") == (10.0, 10 / 60)
+    assert server.parse_rate("5") == (5.0, 5.0)
+
+
+def test_take_allows_a_burst_then_reports_the_wait(clock):
+    buckets = server.TokenBuckets(4, 100)
+    capacity, rate = server.parse_rate("3/60")
+    assert [buckets.take("k", capacity, rate) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("k", capacity, rate) == pytest.approx(20.0)
+    # Other keys have their own bucket
+    assert buckets.take("other", capacity, rate) == 0
+
+    clock[0] += 19
+    assert buckets.take("k", capacity, rate) == pytest.approx(1.0)
+    clock[0] += 1
+    assert buckets.take("k", capacity, rate) == 0
+    assert buckets.take("k", capacity, rate) > 0
+
+
+def test_refill_is_capped_at_capacity(clock):
+    buckets = server.TokenBuckets(1, 100)
+    buckets.take("k", 2, 1)
+    clock[0] += 3600
+    assert [buckets.take("k", 2, 1) for _ in range(3)] == [0, 0, pytest.approx(1.0)]
+
+
+def test_shards_evict_the_least_recently_used_bucket(clock):
+    buckets = server.TokenBuckets(1, 2)
+    buckets.take("a", 1, 0.001)
+    buckets.take("b", 1, 0.001)
+    buckets.take("a", 1, 0.001)
+    buckets.take("c", 1, 0.001)
+    assert buckets.stats()["buckets"] == 2
+    # "a" was used more recently than "b", so it is still empty while "b" starts full again
+    assert buckets.take("a", 1, 0.001) > 0
+    assert buckets.take("b", 1, 0.001) == 0
+
+
+def test_login_is_limited_per_ip_and_email(client, auth, monkeypatch):
+    monkeypatch.setitem(server.RATE_LIMIT_RULES, "login", server.parse_rate("2/60"))
+    auth("a@example.com")
+    auth("b@example.com")
+    login = {"email": "a@example.com", "password": "secret"}
+    assert [client.post("/api/auth/login", json=login).status_code for _ in range(2)] == [200, 200]
+    limited = client.post("/api/auth/login", json=login)
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 30
+    # Another account behind the same address is unaffected
+    other = client.post("/api/auth/login", json={"email": "b@example.com", "password": "secret"})
+    assert other.status_code == 200
+
+
+def test_login_from_one_ip_across_many_emails_is_limited(client, monkeypatch):
+    monkeypatch.setitem(server.RATE_LIMIT_RULES, "login_ip", server.parse_rate("5/60"))
+    codes = [client.post("/api/auth/login", json={"email": f"u{i}@example.com", "password": "x"}).status_code
+             for i in range(6)]
+    assert codes == [401] * 5 + [429]
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+
+def at(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+async def seed_minute(database, bucket, runs, key="a1"):
+    for scope, k in (("automation", key), ("user", "u1")):
+        await database.run_metrics.insert_one({
+            "_id": server.metric_id(scope, k, "minute", bucket), "scope": scope, "key": k, "user_id": "u1",
+            "granularity": "minute", "bucket": bucket, "runs": runs, "succeeded": runs, "failed": 0,
+            "minutes_saved": 5 * runs, "duration_ms": 10 * runs,
+        })
+
+
+async def buckets(database, granularity):
+    docs = await database.run_metrics.find({"granularity": granularity}).to_list(None)
+    return {(d["scope"], d["key"], d["bucket"].replace(tzinfo=timezone.utc)): d["runs"] for d in docs}
+
+
+@pytest.mark.anyio
+async def test_minutes_roll_into_hours_and_hours_into_days(database, monkeypatch):
+    # A small batch forces several windows and several bulk writes per window
+    monkeypatch.setattr(server, "METRICS_COMPACT_BATCH", 3)
+    for minute in range(0, 60, 10):
+        await seed_minute(database, at(2026, 10, 15, 9, minute), 1)
+    await seed_minute(database, at(2026, 10, 15, 10, 5), 2)
+    await seed_minute(database, at(2026, 10, 16, 23, 59), 4, key="a2")
+    # Still inside the minute retention window
+    await seed_minute(database, at(2026, 10, 17, 11, 0), 8)
+
+    assert await server.roll_up_metrics("minute", "hour", at(2026, 10, 17, 10)) == 16
+    assert await buckets(database, "minute") == {
+        ("automation", "a1", at(2026, 10, 17, 11)): 8, ("user", "u1", at(2026, 10, 17, 11)): 8,
+    }
+    assert await buckets(database, "hour") == {
+        ("automation", "a1", at(2026, 10, 15, 9)): 6, ("user", "u1", at(2026, 10, 15, 9)): 6,
+        ("automation", "a1", at(2026, 10, 15, 10)): 2, ("user", "u1", at(2026, 10, 15, 10)): 2,
+        ("automation", "a2", at(2026, 10, 16, 23)): 4, ("user", "u1", at(2026, 10, 16, 23)): 4,
+    }
+
+    assert await server.roll_up_metrics("hour", "day", at(2026, 10, 16)) == 4
+    assert await buckets(database, "day") == {
+        ("automation", "a1", at(2026, 10, 15)): 8, ("user", "u1", at(2026, 10, 15)): 8,
+    }
+    day = await database.run_metrics.find_one({"_id": server.metric_id("user", "u1", "day", at(2026, 10, 15))})
+    assert (day["minutes_saved"], day["duration_ms"]) == (40, 80)
+    # The 16th is within the hour retention window and stays at hourly resolution
+    assert set(await buckets(database, "hour")) == {("automation", "a2", at(2026, 10, 16, 23)), ("user", "u1", at(2026, 10, 16, 23))}
+
+
+@pytest.mark.anyio
+async def test_rollup_is_idempotent_when_rerun(database):
+    await seed_minute(database, at(2026, 10, 15, 9, 1), 3)
+    assert await server.roll_up_metrics("minute", "hour", at(2026, 10, 17)) == 2
+    assert await server.roll_up_metrics("minute", "hour", at(2026, 10, 17)) == 0
+    assert await buckets(database, "hour") == {
+        ("automation", "a1", at(2026, 10, 15, 9)): 3, ("user", "u1", at(2026, 10, 15, 9)): 3,
+    }
+
+
+@pytest.mark.anyio
+async def test_timeseries_reads_across_granularities(database):
+    await seed_minute(database, at(2026, 10, 15, 9, 1), 3)
+    await server.roll_up_metrics("minute", "hour", at(2026, 10, 17))
+    await seed_minute(database, at(2026, 10, 15, 9, 30), 1)
+    points = await server.read_timeseries("user", "u1", "u1", at(2026, 10, 15, 9), at(2026, 10, 15, 10), "hour")
+    assert [p["runs"] for p in points] == [4]
+    assert points[0]["t"] == at(2026, 10, 15, 9).isoformat()
+    assert len(await server.read_timeseries("user", "u1", "u1", at(2026, 10, 15), at(2026, 10, 15) + timedelta(days=1), "hour")) == 24
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def automation(*nodes):
+    return {"id": "a1", "name": "Test", "user_id": "u1", "version": 1, "time_saved_minutes": 5,
+            "nodes": [{"type": t, "value": v} for t, v in nodes]}
+
+
+@pytest.fixture
+def slow_node():
+    gate = {"release": None}
+
+    async def slow(value, context):
+        if gate["release"] is not None:
+            await gate["release"].wait()
+        else:
+            await asyncio.sleep(1)
+        return {"slow": value}
+
+    server.register_node_handler("slow", slow)
+    yield gate
+    server.NODE_HANDLERS.pop("slow", None)
+
+
+@pytest.mark.anyio
+async def test_run_executes_nodes_in_order(database):
+    runner = server.AutomationRunner(1, 0, 1.0, server.PlanCache(10))
+    runner.start()
+    run = await runner.run(automation(("trigger", "Every Monday"), ("action", "Post")), {"k": 1})
+    assert run["status"] == "succeeded"
+    assert [s["type"] for s in run["steps"]] == ["trigger", "action"]
+    assert run["steps"][0]["output"]["payload"] == {"k": 1}
+    assert await database.automation_runs.count_documents({"automation_id": "a1"}) == 1
+
+
+@pytest.mark.anyio
+async def test_node_timeout_fails_the_run(database, slow_node):
+    runner = server.AutomationRunner(1, 0, 0.05, server.PlanCache(10))
+    runner.start()
+    run = await runner.run(automation(("slow", ""), ("action", "never")))
+    assert run["status"] == "failed"
+    assert run["error"] == "Step 1 (slow) failed: Timed out after 0.05s"
+    assert len(run["steps"]) == 1
+    assert runner.stats()["failed"] == 1
+
+
+@pytest.mark.anyio
+async def test_full_runner_rejects_runs_and_submits(database, slow_node):
+    runner = server.AutomationRunner(1, 1, 1.0, server.PlanCache(10))
+    runner.start()
+    slow_node["release"] = release = asyncio.Event()
+    first = runner.submit(automation(("slow", "1")), None, "webhook")
+    second = runner.submit(automation(("slow", "2")), None, "webhook")
+    assert first is not None and second is not None
+    assert runner.free() == 0
+
+    assert runner.submit(automation(("action", "x")), None, "webhook") is None
+    with pytest.raises(HTTPException) as excinfo:
+        await runner.run(automation(("action", "x")))
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.headers["Retry-After"] == "1"
+    assert runner.stats()["rejected"] == 2
+
+    release.set()
+    await asyncio.gather(first, second)
+    assert runner.free() == 2
+    assert (await runner.run(automation(("action", "x"))))["status"] == "succeeded"
+
+
+def test_run_endpoint_returns_503_when_full(client, auth, monkeypatch):
+    headers = auth()
+    created = client.post("/api/automations", json={"name": "n", "template_id": "t4"}, headers=headers).json()
+    monkeypatch.setattr(server.automation_runner, "pending", server.automation_runner.capacity)
+    response = client.post(f"/api/automations/{created['id']}/run", headers=headers)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import server
+
+UTC = ZoneInfo("UTC")
+
+
+@pytest.mark.parametrize("trigger, kind, hour, minute, weekdays, day, every", [
+    ("Every Monday 9 AM", "daily", 9, 0, {0}, "", 0),
+    ("On Mondays and Fridays at 4:30 pm", "daily", 16, 30, {0, 4}, "", 0),
+    ("Daily at 10 AM", "daily", 10, 0, None, "", 0),
+    ("Every weekday at 08:15", "daily", 8, 15, {0, 1, 2, 3, 4}, "", 0),
+    ("Every 15 minutes", "interval", 9, 0, None, "", 15),
+    ("Hourly", "hourly", 9, 0, None, "", 0),
+    ("End of month", "monthly", 9, 0, None, "last", 0),
+    ("Start of month at 7am", "monthly", 7, 0, None, "first", 0),
+    ("When an invoice arrives, every Monday", "daily", 9, 0, {0}, "", 0),
+])
+def test_parse_schedule(trigger, kind, hour, minute, weekdays, day, every):
+    schedule = server.parse_schedule(trigger)
+    assert (schedule.kind, schedule.hour, schedule.minute, schedule.weekdays, schedule.day, schedule.every) == \
+        (kind, hour, minute, weekdays, day, every)
+
+
+@pytest.mark.parametrize("trigger", [
+    "When a form is submitted on Monday",
+    "PTO form submitted",
+    "New email with lead info",
+    "Inventory change",
+    "Every 0 minutes",
+    "",
+])
+def test_event_triggers_are_not_scheduled(trigger):
+    assert server.parse_schedule(trigger) is None
+
+
+def at(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_next_after_weekly_skips_to_the_next_matching_day():
+    schedule = server.parse_schedule("Every Monday 9 AM")
+    # 2026-10-12 is a Monday
+    assert schedule.next_after(at(2026, 10, 12, 8, 59), UTC) == at(2026, 10, 12, 9, 0)
+    assert schedule.next_after(at(2026, 10, 12, 9, 0), UTC) == at(2026, 10, 19, 9, 0)
+
+
+def test_next_after_daily_and_hourly():
+    assert server.parse_schedule("Daily at 10 AM").next_after(at(2026, 10, 17, 11, 0), UTC) == at(2026, 10, 18, 10, 0)
+    assert server.parse_schedule("Hourly").next_after(at(2026, 10, 17, 11, 30), UTC) == at(2026, 10, 17, 12, 0)
+
+
+def test_next_after_interval_aligns_to_the_step():
+    schedule = server.parse_schedule("Every 15 minutes")
+    assert schedule.next_after(at(2026, 10, 17, 11, 7, 30), UTC) == at(2026, 10, 17, 11, 15)
+    assert schedule.next_after(at(2026, 10, 17, 11, 15), UTC) == at(2026, 10, 17, 11, 30)
+
+
+def test_next_after_end_of_month_rolls_over_the_year():
+    schedule = server.parse_schedule("End of month")
+    assert schedule.next_after(at(2026, 2, 10), UTC) == at(2026, 2, 28, 9, 0)
+    assert schedule.next_after(at(2026, 12, 31, 9, 0), UTC) == at(2027, 1, 31, 9, 0)
+
+
+def test_next_after_uses_the_scheduler_timezone():
+    schedule = server.parse_schedule("Daily at 9 AM")
+    berlin = ZoneInfo("Europe/Berlin")
+    # 9:00 in Berlin is 07:00 UTC in summer time and 08:00 UTC after the switch on 2026-10-25
+    assert schedule.next_after(at(2026, 10, 24, 12, 0), berlin) == at(2026, 10, 25, 8, 0)
+    assert schedule.next_after(at(2026, 10, 23, 12, 0), berlin) == at(2026, 10, 24, 7, 0)
@@ -0,0 +1,55 @@
+import json
+
+import server
+
+
+def parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_parser_emits_each_field_once_its_closing_quote_arrives():
+    raw = json.dumps({"name": "Say \"hi\"", "description": "a\\b", "category": "custom"})
+    parser = server.IncrementalSuggestionParser()
+    emitted = []
+    for i in range(0, len(raw), 3):
+        emitted.extend(parser.feed(raw[i:i + 3]))
+    assert emitted == [("name", 'Say "hi"'), ("description", "a\\b"), ("category", "custom")]
+    assert parser.feed("") == []
+
+
+def test_parser_does_not_emit_a_partial_value():
+    parser = server.IncrementalSuggestionParser()
+    assert parser.feed('{"name": "Weekly rep') == []
+    assert parser.feed('ort", "trig') == [("name", "Weekly report")]
+
+
+def test_sse_event_format():
+    assert server.sse_event("field", {"v": "é"}, "7") == 'id: 7\nevent: field\ndata: {"v": "é"}\n\n'
+    assert server.sse_event("start", {}) == "event: start\ndata: {}\n\n"
+
+
+def test_stream_sends_tokens_fields_and_the_final_result(client, auth):
+    response = client.post("/api/ai/suggest/stream", json={"message": "order pizza every friday"}, headers=auth())
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    kinds = [kind for kind, _ in events]
+    assert kinds[0] == "start" and kinds[-1] == "done"
+    assert "token" in kinds
+    # Fields arrive before the stream finishes
+    assert kinds.index("field") < kinds.index("done")
+    fields = {data["field"]: data["value"] for kind, data in events if kind == "field"}
+    done = events[-1][1]
+    assert done["suggestion"]["description"] == "order pizza every friday"
+    assert fields["name"] == done["suggestion"]["name"]
+    assert "".join(data["text"] for kind, data in events if kind == "token") == done["raw"]
+
+
+def test_stream_answers_template_matches_without_tokens(client, auth):
+    response = client.post("/api/ai/suggest/stream", json={"message": "parse pdf invoices"}, headers=auth())
+    events = parse_sse(response.text)
+    assert "token" not in [kind for kind, _ in events]
+    assert events[-1][1]["match"]["template_id"] == "t2"
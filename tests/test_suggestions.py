@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    monkeypatch.setattr(server, "suggestion_cache", server.TTLCache(10, 60))
+    monkeypatch.setattr(server, "suggestion_flights", server.SingleFlight())
+    calls = []
+
+    async def generate(message):
+        calls.append(message)
+        await asyncio.sleep(0.01)
+        return {"suggestion": {"name": message}, "raw": ""}
+
+    monkeypatch.setattr(server, "generate_suggestion", generate)
+    return calls
+
+
+def test_normalize_prompt():
+    assert server.normalize_prompt("  Send the WEEKLY report, to Slack!! ") == "send the weekly report to slack"
+
+
+@pytest.mark.anyio
+async def test_equivalent_prompts_share_one_cached_answer(generated):
+    first = await server.suggest("Order pizza every Friday")
+    again = await server.suggest("order pizza, every friday!")
+    assert first == again
+    assert generated == ["Order pizza every Friday"]
+    assert server.suggestion_cache.stats()["hits"] == 1
+
+
+@pytest.mark.anyio
+async def test_concurrent_identical_prompts_are_coalesced(generated):
+    results = await asyncio.gather(*(server.suggest("order pizza every friday") for _ in range(5)))
+    assert len(generated) == 1
+    assert all(r == results[0] for r in results)
+    assert server.suggestion_flights.coalesced == 4
+
+
+@pytest.mark.anyio
+async def test_failures_are_shared_but_not_cached(generated, monkeypatch):
+    generate = server.generate_suggestion
+
+    async def failing(message):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(server, "generate_suggestion", failing)
+    results = await asyncio.gather(*(server.suggest("order pizza") for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert server.suggestion_flights.coalesced == 2
+    assert server.suggestion_cache.stats()["size"] == 0
+    # The next call tries again rather than replaying the failure
+    monkeypatch.setattr(server, "generate_suggestion", generate)
+    assert (await server.suggest("order pizza"))["suggestion"]["name"] == "order pizza"
+
+
+@pytest.mark.anyio
+async def test_a_cancelled_caller_does_not_cancel_the_shared_call(generated):
+    first = asyncio.create_task(server.suggest("order pizza"))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(server.suggest("order pizza"))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert (await second)["suggestion"]["name"] == "order pizza"
+    assert len(generated) == 1
+
+
+@pytest.mark.anyio
+async def test_template_matches_skip_the_cache_and_the_llm(generated):
+    result = await server.suggest("parse pdf invoices")
+    assert result["match"]["template_id"] == "t2"
+    assert generated == []
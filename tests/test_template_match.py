@@ -0,0 +1,48 @@
+import pytest
+
+import server
+
+
+@pytest.mark.parametrize("message, template_id", [
+    ("sync leads from gmail into my crm", "t1"),
+    ("create crm contact from new lead emails", "t1"),
+    ("extract invoice data from pdf files", "t2"),
+    ("parse pdf invoices", "t2"),
+    ("send welcome docs to new hires and notify slack", "t3"),
+    ("onboard new employees with welcome docs", "t3"),
+])
+def test_paraphrases_are_answered_from_the_catalog(message, template_id):
+    result = server.template_suggestion(message)
+    assert result is not None
+    assert result["match"]["template_id"] == template_id
+    assert result["suggestion"]["template_id"] == template_id
+
+
+@pytest.mark.parametrize("message", [
+    # Shares "post", "slack" and "every" with the weekly Slack report, but is not it
+    "post to slack every day",
+    "daily standup reminder in slack",
+    "weekly report",
+    "send me a weekly sales report every monday",
+    "post on social media",
+    "send invoices",
+    "order pizza every friday",
+    "remind me to drink water",
+])
+def test_near_misses_fall_through_to_the_llm(message):
+    assert server.template_suggestion(message) is None
+
+
+def test_runner_up_margin_is_required(monkeypatch):
+    assert server.template_suggestion("email leads crm") is not None
+    monkeypatch.setattr(server, "TEMPLATE_MATCH_MARGIN", 0.4)
+    assert server.template_suggestion("email leads crm") is None
+
+
+def test_suggest_endpoint_uses_the_llm_for_near_misses(client, auth):
+    headers = auth()
+    local = client.post("/api/ai/suggest", json={"message": "parse pdf invoices"}, headers=headers).json()
+    assert local["match"]["template_id"] == "t2"
+    remote = client.post("/api/ai/suggest", json={"message": "post to slack every day"}, headers=headers).json()
+    assert "match" not in remote
+    assert remote["suggestion"]["description"] == "post to slack every day"
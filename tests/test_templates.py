@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import server
+
+
+def test_catalog_lookup_and_category_bodies():
+    catalog = server.TemplateCatalog(server.TEMPLATES)
+    assert catalog.get("t4")["name"] == "Weekly report to Slack"
+    assert catalog.get("missing") is None and catalog.get(None) is None
+    body, _ = catalog.encoded("hr")
+    assert {t["id"] for t in json.loads(body)} == {"t3", "t10"}
+    assert json.loads(catalog.encoded(None)[0]) == server.TEMPLATES
+    assert json.loads(catalog.encoded("unknown")[0]) == []
+
+
+def test_reload_changes_the_etag_only_for_changed_categories():
+    catalog = server.TemplateCatalog(server.TEMPLATES)
+    before = {c: catalog.encoded(c)[1] for c in (None, "hr", "sales")}
+    catalog.load([{**t, "name": "Renamed"} if t["id"] == "t3" else t for t in server.TEMPLATES])
+    assert catalog.encoded("hr")[1] != before["hr"]
+    assert catalog.encoded(None)[1] != before[None]
+    assert catalog.encoded("sales")[1] == before["sales"]
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", "abc"', True),
+    ("*", True),
+    ('"abcd"', False),
+])
+def test_etag_matches(if_none_match, expected):
+    assert server.etag_matches(if_none_match, '"abc"') is expected
+
+
+def test_templates_revalidate_with_304(client):
+    response = client.get("/api/templates", params={"category": "finance"})
+    assert response.status_code == 200
+    assert [t["id"] for t in response.json()] == ["t2", "t7"]
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "public, max-age=60"
+    cached = client.get("/api/templates", params={"category": "finance"}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+    other = client.get("/api/templates", headers={"If-None-Match": etag})
+    assert other.status_code == 200 and len(other.json()) == len(server.TEMPLATES)
+
+
+def test_automation_from_template_copies_its_fields(client, auth):
+    auto = client.post("/api/automations", json={"name": "x", "template_id": "t2"}, headers=auth()).json()
+    assert (auto["trigger"], auto["action"], auto["time_saved_minutes"]) == ("New PDF in Drive", "Extract data to Sheets", 60)
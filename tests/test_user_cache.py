@@ -0,0 +1,67 @@
+import pytest
+
+import server
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = server.TTLCache(10, 60)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2}, ttl=5)
+    clock[0] += 5.5
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("b") is None
+    clock[0] += 60
+    assert cache.get("a") is None
+    assert cache.stats() == {"size": 0, "hits": 1, "misses": 2, "hit_rate": 0.3333}
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = server.TTLCache(2, 60)
+    cache.set("a", {})
+    cache.set("b", {})
+    cache.get("a")
+    cache.set("c", {})
+    assert cache.get("b") is None
+    assert cache.get("a") == {} and cache.get("c") == {}
+
+
+def test_callers_get_copies(clock):
+    cache = server.TTLCache(2, 60)
+    value = {"name": "x"}
+    cache.set("a", value)
+    value["name"] = "changed"
+    cache.get("a")["name"] = "also changed"
+    assert cache.get("a") == {"name": "x"}
+
+
+def test_authenticated_requests_reuse_the_cached_user(client, auth, monkeypatch):
+    headers = auth()
+    # A long-lived entry regardless of onboarding state, so only invalidation can refresh it
+    monkeypatch.setattr(server, "USER_CACHE_ONBOARDING_TTL", 60)
+    server.user_cache.clear()
+    misses = server.user_cache.misses
+    for _ in range(3):
+        assert client.get("/api/auth/me", headers=headers).json()["onboarded"] is False
+    # Only the first request went to the database
+    assert server.user_cache.misses == misses + 1
+
+    # onboard_user invalidates this worker's entry, so the change shows up at once
+    assert client.put("/api/auth/onboard", json={"job_title": "Ops", "industry": "Retail"}, headers=headers).status_code == 200
+    me = client.get("/api/auth/me", headers=headers).json()
+    assert (me["onboarded"], me["job_title"]) == (True, "Ops")
+    assert "password" not in me
+    assert server.user_cache.misses == misses + 2
+
+
+def test_cached_user_is_never_served_for_a_scoped_token(client, auth):
+    headers = auth()
+    client.get("/api/auth/me", headers=headers)
+    live = client.post("/api/live/token", headers=headers).json()["token"]
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {live}"}).status_code == 401
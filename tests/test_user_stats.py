@@ -0,0 +1,55 @@
+import pytest
+
+import server
+
+
+def automation(user_id, status="active", tasks_run=0, time_saved=10, minutes_saved=0):
+    return {"id": f"{user_id}-{status}-{tasks_run}", "user_id": user_id, "status": status, "tasks_run": tasks_run,
+            "time_saved_minutes": time_saved, "minutes_saved": minutes_saved}
+
+
+@pytest.mark.anyio
+async def test_rebuild_counts_from_the_automations(database):
+    await database.automations.insert_many([
+        automation("u1", tasks_run=3, minutes_saved=30),
+        automation("u1", status="paused", tasks_run=1, time_saved=20),
+        automation("u2"),
+    ])
+    stats = await server.rebuild_user_stats("u1")
+    assert stats == {"automations": 2, "active": 1, "tasks_run": 4, "time_saved_minutes": 30, "minutes_saved": 30}
+    assert await server.get_user_stats("u1") == stats
+    assert await server.rebuild_user_stats("nobody") == {f: 0 for f in server.STATS_FIELDS}
+
+
+@pytest.mark.anyio
+async def test_delta_seeds_missing_counters_then_increments(database):
+    await database.automations.insert_one(automation("u1"))
+    # No user_stats yet: the first delta rebuilds from the source of truth instead of
+    # starting from zero
+    await server.apply_stats_delta("u1", automations=1, active=1, time_saved_minutes=10)
+    assert (await server.get_user_stats("u1"))["automations"] == 1
+    await server.apply_stats_delta("u1", active=-1, tasks_run=0)
+    stats = await server.get_user_stats("u1")
+    assert (stats["automations"], stats["active"], stats["tasks_run"]) == (1, 0, 0)
+
+
+@pytest.mark.anyio
+async def test_rebuild_all_drops_counters_of_users_without_automations(database):
+    await database.automations.insert_many([automation("u1"), automation("u2", status="paused")])
+    await database.user_stats.insert_one({"_id": "gone", "automations": 5})
+    assert await server.rebuild_all_user_stats() == 2
+    assert await database.user_stats.find_one({"_id": "gone"}) is None
+    assert (await server.get_user_stats("u2"))["active"] == 0
+
+
+def test_dashboard_counters_follow_every_write(client, auth, database):
+    headers = auth()
+    ids = [client.post("/api/automations", json={"name": f"a{i}"}, headers=headers).json()["id"] for i in range(3)]
+    client.put(f"/api/automations/{ids[0]}/toggle", headers=headers)
+    client.delete(f"/api/automations/{ids[1]}", headers=headers)
+    stats = client.get("/api/dashboard/stats", headers=headers).json()
+    assert (stats["total_automations"], stats["active_automations"]) == (2, 1)
+    # The incrementally maintained counters agree with a full recount
+    user_id = client.get("/api/auth/me", headers=headers).json()["id"]
+    rebuilt = client.portal.call(server.rebuild_user_stats, user_id)
+    assert (rebuilt["automations"], rebuilt["active"]) == (2, 1)